@@ -3,15 +3,49 @@
 __author__ = "Hirad Yazdanpanah"
 __license__ = "MIT"
 __maintainer__ = "Hirad Yazdanpanah"
+__version__ = "0.1.6"
 
-import io
 import sys
+
+# has to happen before anything else is imported for the timings to be of any use,
+# which is why it cannot wait for the cli arguments to be parsed
+if '--startup-profile' in sys.argv:
+    from profiling import import_profiler
+
+    import_profiler.install()
+
+import io
 import ast
 import ConfigParser
 
 from base import Base
 from healthcheck import AmplifyAgentHealthCheck
 
+# options added after the first release, so that a config.ini from before them keeps working
+option_defaults = {
+    'cache_dir': '/var/cache/amphc',
+    'time_budget': '0',
+    'http_pool_size': '10',
+    'amplify_log_staleness_window': '600',
+    'amplify_log_scan_max_bytes': '8388608',
+    'amplify_log_scan_window': '3600',
+    'amplify_receiver_url': 'https://receiver.amplify.nginx.com:443/ping',
+    'amplify_receiver_timeout': '10',
+    'nginx_conf_parse_jobs': '1',
+    'nginx_stub_status_interval': '1',
+    'nginx_stub_status_timeout': '5',
+    'nginx_log_sample_lines': '1000',
+    'nginx_log_sample_max_bytes': '1048576',
+    'nginx_log_volume_window': '2',
+    'nginx_log_volume_max_lines_rate': '5000',
+    'nginx_log_volume_max_read_bytes': '8388608',
+    'system_ntp_servers': "['0.pool.ntp.org', '1.pool.ntp.org', '2.pool.ntp.org', '3.pool.ntp.org']",
+    'system_ntp_quorum': '2',
+    'system_ntp_timeout': '5',
+    'system_resolv_conf_file': '/etc/resolv.conf',
+    'system_dns_timeout': '2',
+}
+
 
 def configure(**attrs):
     amphc = init(**attrs).configure().generate_output()
@@ -27,7 +61,7 @@ def init(**attrs):
         with open(config_file) as f:
             config_stream = f.read()
 
-        config = ConfigParser.RawConfigParser(allow_no_value=True)
+        config = ConfigParser.RawConfigParser(option_defaults, allow_no_value=True)
         config.readfp(io.BytesIO(config_stream))
 
         if custom_config_file:
@@ -43,6 +77,11 @@ def init(**attrs):
         verbose=attrs.get('verbose', False),
         decorate_mode=attrs.get('decorate_mode', True),
         heading=config.get('options', 'heading'),
+        cache_dir=config.get('options', 'cache_dir'),
+        use_cache=attrs.get('use_cache', True),
+        jobs=attrs.get('jobs', 1),
+        time_budget=attrs.get('time_budget', config.getfloat('options', 'time_budget')),
+        http_pool_size=config.getint('options', 'http_pool_size'),
 
         # Amplify
         amplify_agent_path=config.get('options', 'amplify_agent_path'),
@@ -50,22 +89,40 @@ def init(**attrs):
         amplify_conf_file=config.get('options', 'amplify_conf_file'),
         amplify_log_file=config.get('options', 'amplify_log_file'),
         amplify_pid_file=config.get('options', 'amplify_pid_file'),
+        amplify_log_staleness_window=config.getint('options', 'amplify_log_staleness_window'),
+        amplify_log_scan_max_bytes=config.getint('options', 'amplify_log_scan_max_bytes'),
+        amplify_log_scan_window=config.getint('options', 'amplify_log_scan_window'),
+        amplify_receiver_url=config.get('options', 'amplify_receiver_url'),
+        amplify_receiver_timeout=config.getfloat('options', 'amplify_receiver_timeout'),
 
         # Nginx
         nginx_all_confs_path=config.get('options', 'nginx_all_confs_path'),
         nginx_conf_file=config.get('options', 'nginx_conf_file'),
+        nginx_conf_parse_jobs=config.getint('options', 'nginx_conf_parse_jobs'),
         nginx_status_conf_file=config.get('options', 'nginx_status_conf_file'),
+        nginx_stub_status_interval=config.getfloat('options', 'nginx_stub_status_interval'),
+        nginx_stub_status_timeout=config.getfloat('options', 'nginx_stub_status_timeout'),
         nginx_sites_available_conf_files=config.get('options', 'nginx_sites_available_conf_files'),
         nginx_sites_enabled_conf_files=config.get('options', 'nginx_sites_enabled_conf_files'),
         nginx_mime_types_file=config.get('options', 'nginx_mime_types_file'),
         nginx_log_files=config.get('options', 'nginx_log_files'),
+        nginx_log_sample_lines=config.getint('options', 'nginx_log_sample_lines'),
+        nginx_log_sample_max_bytes=config.getint('options', 'nginx_log_sample_max_bytes'),
+        nginx_log_volume_window=config.getfloat('options', 'nginx_log_volume_window'),
+        nginx_log_volume_max_lines_rate=config.getfloat('options', 'nginx_log_volume_max_lines_rate'),
+        nginx_log_volume_max_read_bytes=config.getint('options', 'nginx_log_volume_max_read_bytes'),
         nginx_pid_file=config.get('options', 'nginx_pid_file'),
         nginx_additional_metrics=ast.literal_eval(config.get('options', 'nginx_additional_metrics')),
 
         # System
         system_packages=ast.literal_eval(config.get('options', 'system_packages')),
         system_find_package_command=ast.literal_eval(config.get('options', 'system_find_package_command')),
-        system_time_diff_max_allowance=config.get('options', 'system_time_diff_max_allowance')
+        system_time_diff_max_allowance=config.getfloat('options', 'system_time_diff_max_allowance'),
+        system_ntp_servers=ast.literal_eval(config.get('options', 'system_ntp_servers')),
+        system_ntp_quorum=config.getint('options', 'system_ntp_quorum'),
+        system_ntp_timeout=config.getfloat('options', 'system_ntp_timeout'),
+        system_resolv_conf_file=config.get('options', 'system_resolv_conf_file'),
+        system_dns_timeout=config.getfloat('options', 'system_dns_timeout')
     )
 
     return amphc
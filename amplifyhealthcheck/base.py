@@ -1,13 +1,162 @@
 # -*- coding: utf-8 -*-
 
-import psutil
 import os
+import grp
+import errno
+import mmap
+import marshal
 import pwd
+import threading
 
+from collections import namedtuple, OrderedDict
 from datetime import datetime
+from hashlib import md5
 from stat import S_IRGRP, S_IRUSR
 from subprocess import check_output
 from glob import glob
+from procfs import ProcessSnapshot
+
+try:
+    from os import scandir
+except ImportError:
+    from scandir import scandir
+
+# error is set, and stat None, for a directory that cannot be listed or a dangling symlink
+FileEntry = namedtuple('FileEntry', ['path', 'name', 'stat', 'error'])
+
+
+def parse_apk_packages(output):
+    return set(line.strip() for line in output.splitlines() if line.strip())
+
+
+def parse_dpkg_packages(output):
+    packages = set()
+
+    for line in output.splitlines():
+        fields = line.split()
+
+        if len(fields) > 1 and fields[1].startswith('ii'):
+            packages.add(fields[0].split(':')[0])
+
+    return packages
+
+
+def parse_rpm_packages(output):
+    return set(line.strip() for line in output.splitlines() if line.strip())
+
+
+package_queries = {
+    'apk': (['apk', 'info'], parse_apk_packages),
+    'dpkg': (['dpkg-query', '-W', '-f=${Package} ${db:Status-Abbrev}\n'], parse_dpkg_packages),
+    'dpkg-query': (['dpkg-query', '-W', '-f=${Package} ${db:Status-Abbrev}\n'], parse_dpkg_packages),
+    'rpm': (['rpm', '-qa', '--qf', '%{NAME}\n'], parse_rpm_packages)
+}
+
+
+def marshal_cache_file(cache_dir, prefix, path):
+    return os.path.join(cache_dir, '{0}-{1}.marshal'.format(prefix, md5(os.path.abspath(path)).hexdigest()[:16]))
+
+
+def read_marshal_cache(cache_file, version):
+    try:
+        with open(cache_file, 'rb') as f:
+            cache = marshal.load(f)
+
+        if cache['version'] == version:
+            return cache['data']
+    except (IOError, OSError, EOFError, ValueError, TypeError, KeyError):
+        pass
+
+    return None
+
+
+def write_marshal_cache(cache_file, version, data):
+    # written aside and renamed, so a concurrent run never reads a partial cache
+    temp_file = '{0}.{1}'.format(cache_file, os.getpid())
+
+    try:
+        cache_dir = os.path.dirname(cache_file)
+
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+        with open(temp_file, 'wb') as f:
+            marshal.dump({'version': version, 'data': data}, f)
+
+        os.rename(temp_file, cache_file)
+    except (IOError, OSError):
+        # a cache that cannot be written only costs the next run the work it would have saved
+        pass
+
+
+class NameCache(object):
+    def __init__(self, lookup, size=256):
+        self.lookup = lookup
+        self.size = size
+        self.names = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            name = self.names.pop(key, None)
+
+            if name is not None:
+                self.names[key] = name
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if name is None:
+            # outside of the lock, with NSS on LDAP/SSSD this can be a network round trip
+            try:
+                name = self.lookup(key)
+            except KeyError, exc:
+                name = exc
+
+            with self.lock:
+                self.names[key] = name
+
+                if len(self.names) > self.size:
+                    self.names.popitem(last=False)
+
+        # unknown ids are cached too, they cost the same lookup every time
+        if isinstance(name, KeyError):
+            raise name
+
+        return name
+
+    def clear(self):
+        with self.lock:
+            self.names.clear()
+
+
+class lazy_attribute(object):
+    # shared by every instance, the methods behind these are few and run once each
+    lock = threading.RLock()
+
+    def __init__(self, method):
+        self.method = method
+        self.name = method.__name__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        with self.lock:
+            # computed on first use and kept on the instance, where assigning to it replaces it
+            if self.name not in instance.__dict__:
+                instance.__dict__[self.name] = self.method(instance)
+
+            return instance.__dict__[self.name]
+
+    @classmethod
+    def reset(cls, instance):
+        for klass in type(instance).__mro__:
+            for name, attribute in vars(klass).items():
+                if isinstance(attribute, cls):
+                    instance.__dict__.pop(name, None)
 
 
 class Base(object):
@@ -21,7 +170,6 @@ class Base(object):
         self.checkmark = u'\u2713'
         self.crossmark = u'\u2717'
         self.warnmark = u'\u26A0'
-        self.mark = None
 
         self.ltopbord = self.cyan_color + u'┌'.encode('utf-8') + self.no_color
         self.lbtmbord = self.cyan_color + u'└'.encode('utf-8') + self.no_color
@@ -32,82 +180,123 @@ class Base(object):
 
         self.decorate_mode = False
         self.logs = []
-
-    def file_change_timestamp(self, file_path):
-        return self.os_stat(file_path).st_mtime
+        self.capture = threading.local()
+        self.cancelled = threading.Event()
+        self.ps_snapshot = ProcessSnapshot()
+        self.user_names = NameCache(lambda uid: pwd.getpwuid(uid).pw_name)
+        self.group_names = NameCache(lambda gid: grp.getgrgid(gid).gr_name)
 
     def file_name(self, file_path):
         return os.path.basename(file_path)
 
-    def dir_tree(self, dir_path, file_ext=None):
-        tree = []
+    def file_entry(self, file_path):
+        try:
+            return FileEntry(file_path, os.path.basename(file_path), self.os_stat(file_path), None)
+        except OSError, exc:
+            return FileEntry(file_path, os.path.basename(file_path), None, exc.strerror)
+
+    def walk_files(self, dir_path, file_ext=None, with_stat=True):
+        dir_paths = [dir_path]
+
+        while dir_paths:
+            path = dir_paths.pop()
 
-        for root, dirs, files in os.walk(dir_path):
-            tree.append(root)
+            try:
+                entries = sorted(scandir(path), key=lambda entry: entry.name)
+            except OSError, exc:
+                # the top directory missing is an empty walk, anything below it is reported
+                if path != dir_path or exc.errno != errno.ENOENT:
+                    yield FileEntry(path, os.path.basename(path), None, exc.strerror)
 
-            for filename in files:
-                if file_ext is not None:
-                    if filename.endswith(file_ext):
-                        tree.append(os.path.join(root, filename))
-                else:
-                    tree.append(os.path.join(root, filename))
+                continue
 
-        if len(tree) > 0:
-            tree.pop(0)
+            sub_dir_paths = []
 
-        return tree
+            for entry in entries:
+                # the d_type from readdir answers this without a stat, symlinked
+                # directories are listed but not followed, as with os.walk
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        sub_dir_paths.append(entry.path)
+
+                    continue
+
+                if file_ext is not None and not entry.name.endswith(file_ext):
+                    continue
+
+                st = None
+
+                try:
+                    if with_stat:
+                        st = self.os_stat(entry.path)
+                    elif entry.is_symlink():
+                        # only a symlink can point nowhere, it takes a stat to tell
+                        self.os_stat(entry.path)
+                except OSError, exc:
+                    # dangling symlink or gone since the listing
+                    yield FileEntry(entry.path, entry.name, None, exc.strerror)
+
+                    continue
+
+                yield FileEntry(entry.path, entry.name, st, None)
+
+            dir_paths.extend(reversed(sub_dir_paths))
 
     def files(self, wildcard_file_path):
         return [os.path.join(os.path.split(x)[0], os.path.split(x)[-1]) for x in glob(wildcard_file_path)]
 
+    def installed_packages(self, package_manager):
+        command, parse = package_queries[os.path.basename(package_manager)]
+
+        with open(os.devnull, 'w') as devnull:
+            return parse(check_output(command, stderr=devnull))
+
     def pid(self, name):
-        return check_output(['pidof', name]).split(' ')
+        return self.ps_snapshot.find(name)
 
     def parent_pid(self, pid):
-        return psutil.Process(int(pid)).ppid()
-
-    def all_pids(self):
-        return psutil.pids()
+        return self.ps_snapshot.process(pid).ppid
 
     def ps_name(self, pid):
-        return psutil.Process(int(pid)).name()
+        return self.ps_snapshot.process(pid).name
 
     def ps_path(self, pid):
-        try:
-            return psutil.Process(int(pid)).exe()
-        except psutil.AccessDenied:
-            return 'Permission Denied'
+        exe = self.ps_snapshot.process(pid).exe
+
+        return 'Permission Denied' if exe is None else exe
 
-    def file_owner(self, file_path):
-        uid = self.os_stat(file_path).st_uid
+    def file_owner(self, file_path, st=None):
+        uid = (self.os_stat(file_path) if st is None else st).st_uid
 
-        return pwd.getpwuid(uid).pw_name
+        return self.user_names.get(uid)
 
-    def file_group(self, file_path):
-        gid = self.os_stat(file_path).st_gid
+    def file_group(self, file_path, st=None):
+        gid = (self.os_stat(file_path) if st is None else st).st_gid
 
-        return pwd.getpwuid(gid).pw_name
+        return self.group_names.get(gid)
 
     def ps_owner(self, pid):
-        proc_path = '/proc/%d'
-        uid = self.os_stat(proc_path % int(pid)).st_uid
+        uid = self.ps_snapshot.process(pid).uid
 
-        return pwd.getpwuid(uid).pw_name
+        return self.user_names.get(uid)
 
-    def check_ps_access(self):
-        try:
-            return self.all_pids()
-        except psutil.AccessDenied:
-            return []
+    def check_ps_access(self, pid):
+        return self.ps_snapshot.visible(pid)
+
+    def ps_visibility(self):
+        self.ps_snapshot.taken()
+
+        return len(self.ps_snapshot.processes), self.ps_snapshot.entries
 
     def current_user(self):
-        return pwd.getpwuid(os.getuid())[0]
+        return self.user_names.get(os.getuid())
 
     def check_file(self, file_path):
         return os.path.exists(file_path)
 
-    def check_file_read_perms(self, file_path):
-        st = self.os_stat(file_path)
+    def check_file_read_perms(self, file_path, st=None):
+        if st is None:
+            st = self.os_stat(file_path)
 
         return bool(st.st_mode & S_IRUSR)
 
@@ -115,6 +304,92 @@ class Base(object):
         with open(file_path, 'r') as f:
             return f.read().splitlines()
 
+    def tail_blocks(self, file_path, max_bytes=None, block_size=1 << 20):
+        with open(file_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+
+            if size is 0:
+                return
+
+            mm = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+
+            try:
+                limit = 0 if max_bytes is None else max(size - max_bytes, 0)
+                end = size
+
+                while end > limit:
+                    start = max(end - block_size, limit)
+
+                    # blocks always start on a line boundary, a line cut by the start of
+                    # the block is left for the next (older) block
+                    if start > 0:
+                        newline = mm.find('\n', start - 1, end - 1)
+
+                        if newline == -1:
+                            newline = mm.rfind('\n', max(limit - 1, 0), start)
+
+                            if newline == -1 and limit > 0:
+                                break
+
+                        start = newline + 1
+
+                    yield mm[start:end]
+
+                    end = start
+            finally:
+                mm.close()
+
+    def tail_lines(self, file_path, max_bytes=None, block_size=1 << 20):
+        for block in self.tail_blocks(file_path, max_bytes, block_size):
+            for line in reversed(block.splitlines()):
+                yield line
+
+    def tail_chunk(self, file_path, max_lines, max_bytes=None, block_size=1 << 20):
+        # the newest max_lines lines in file order, as one newline terminated chunk
+        blocks = []
+        lines = 0
+
+        for block in self.tail_blocks(file_path, max_bytes, block_size):
+            if not blocks and not block.endswith('\n'):
+                block += '\n'
+
+            blocks.append(block)
+            lines += block.count('\n')
+
+            if lines >= max_lines:
+                break
+
+        chunk = ''.join(reversed(blocks))
+
+        if lines > max_lines:
+            start = len(chunk)
+
+            for i in range(max_lines):
+                start = chunk.rfind('\n', 0, start - 1) + 1
+
+            chunk = chunk[start:]
+
+        return chunk
+
+    def count_lines(self, file_path, start, end, max_bytes=None, block_size=1 << 20):
+        # newlines in [start, end), reading no more than max_bytes of it
+        end = end if max_bytes is None else min(end, start + max_bytes)
+        lines = 0
+
+        with open(file_path, 'rb') as f:
+            f.seek(start)
+
+            while start < end:
+                block = f.read(min(block_size, end - start))
+
+                if not block:
+                    break
+
+                lines += block.count('\n')
+                start += len(block)
+
+        return lines, start
+
     def os_stat(self, path):
         return os.stat(path)
 
@@ -125,24 +400,34 @@ class Base(object):
         if type(message) is list:
             message = ' '.join([str(item) for item in message])
 
+        # local, checks running on other threads print at the same time
+        message = "{0}{1}{2}".format(self.marker(message_type, mark), message, self.no_color)
+
+        self.emit(message)
+
+    def marker(self, message_type='', mark=True):
         if message_type is 'error':
-            self.mark = self.red_color + (self.crossmark.encode('utf-8') + ' ' if mark else '')
+            return self.red_color + (self.crossmark.encode('utf-8') + ' ' if mark else '')
         elif message_type is 'warn':
-            self.mark = self.yellow_color + (self.warnmark.encode('utf-8') + ' ' if mark else '')
-        else:
-            self.mark = self.green_color + (self.checkmark.encode('utf-8') + ' ' if mark else '')
+            return self.yellow_color + (self.warnmark.encode('utf-8') + ' ' if mark else '')
+
+        return self.green_color + (self.checkmark.encode('utf-8') + ' ' if mark else '')
 
-        message = "{0}{1}{2}".format(self.mark, message, self.no_color)
+    def emit(self, message):
+        buffer = getattr(self.capture, 'buffer', None)
 
-        if self.decorate_mode:
+        if buffer is not None:
+            buffer.append(message)
+        elif self.decorate_mode:
             self.logs.append(message)
         else:
             print(message)
 
     def decorate(self):
-        if self.decorate_mode and len(self.logs) > 0 and self.mark is not None:
+        if self.decorate_mode and len(self.logs) > 0:
             lines = ['check {0} - {1}'.format(i + 1, log) for i, log in enumerate(sorted(set(self.logs)))]
-            spchar_extra_width = len(self.mark + self.no_color) - 2
+            # every mark is as wide as any other
+            spchar_extra_width = len(self.marker() + self.no_color) - 2
             width = max(len(line) for line in lines)
 
             log_list = [self.ltopbord + self.mdlbord * (width - spchar_extra_width) + self.rtopbord]
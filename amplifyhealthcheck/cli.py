@@ -1,8 +1,9 @@
 import argparse
-import pkg_resources
+import sys
 
-from . import configure
+from . import configure, __version__
 from healthcheck import AmplifyAgentHealthCheck
+from scheduler import CheckScheduler
 
 
 def init_cli():
@@ -21,8 +22,10 @@ def init_cli():
         for method in args.get('skip_methods', public_methods):
             callable(getattr(amphc, method))
 
-        for method in args.get('methods', public_methods):
-            getattr(amphc, method)()
+        CheckScheduler(amphc, args.get('jobs', 1), amphc.time_budget).run(args.get('methods', public_methods))
+
+        if args.get('verbose'):
+            amphc.report_stats()
 
         return True
     except AttributeError, exc:
@@ -33,7 +36,6 @@ def init_cli():
 
 
 def cli_args():
-    version = pkg_resources.require('nginx-amplify-agent-health-check')[0].version
     public_methods = verification_methods()
     epilog_content = []
 
@@ -64,7 +66,7 @@ verification methods:
         '-V', '--version',
         dest='version',
         action='version',
-        version='This is %(prog)s version ' + version,
+        version='This is %(prog)s version ' + __version__,
         help="show amphc version number"
     )
 
@@ -82,6 +84,27 @@ verification methods:
         dest='config_file', action='store', help='set configuration file path (i.e. in ini format)'
     )
 
+    parser.add_argument(
+        '-j', '--jobs',
+        dest='jobs', action='store', type=int, metavar='N', help='run up to N checks concurrently (default: 1)'
+    )
+
+    parser.add_argument(
+        '--time-budget',
+        dest='time_budget', action='store', type=float, metavar='SECONDS',
+        help='stop waiting for checks still running after SECONDS and report them as warnings'
+    )
+
+    parser.add_argument(
+        '--no-cache',
+        dest='use_cache', action='store_false', help='ignore the on-disk nginx configuration and build caches'
+    )
+
+    parser.add_argument(
+        '--startup-profile',
+        dest='startup_profile', action='store_true', help='print module import timings of the amphc startup'
+    )
+
     group.add_argument(
         '-x', '--skip',
         dest='skip_methods', action='store', nargs='+', help='specify methods to skip running'
@@ -94,6 +117,12 @@ verification methods:
 
     args = vars(parser.parse_args())
 
+    if args.get('startup_profile'):
+        from profiling import import_profiler
+
+        import_profiler.uninstall()
+        sys.stderr.write(import_profiler.report() + '\n')
+
     return args
 
 
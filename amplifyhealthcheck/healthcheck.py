@@ -1,19 +1,39 @@
 import os
-import pkg_resources
-import ntplib
+import re
+import sys
 import socket
 import atexit
-import crossplane
-import requests
-
-from re import sub
-from subprocess import call, Popen, PIPE
-from base import Base
-from datetime import datetime
-from time import sleep
+import threading
+import ConfigParser
+
+from subprocess import call, CalledProcessError
+from base import Base, lazy_attribute
+from scheduler import CheckScheduler, io_bound, cpu_bound
+from ngxconf import ConfigLoader, index_directives
+from ngxbuild import BuildInspector, install_prefix
+from ngxstatus import parse_stub_status, stub_status_endpoints
+from logformat import access_logs, log_formats, sample_stats
+from ngxproc import discover_instances
+from resolver import Resolver, is_address, read_nameservers
+from urlparse import urlparse
+from time import sleep, time, localtime, strftime
 
 devnull = open(os.devnull, 'w')
 
+agent_log_signatures = (
+    ('CRITICAL', re.compile(r'\bCRITICAL\b')),
+    ('ERROR', re.compile(r'\bERROR\b')),
+    ('failed to connect to receiver', re.compile(r'failed to connect to receiver')),
+    ('permission denied on /proc', re.compile(
+        r'(?:[Pp]ermission denied|[Aa]ccess ?[Dd]enied|[Oo]peration not permitted).*/proc\b|'
+        r'/proc/.*(?:[Pp]ermission denied|[Aa]ccess ?[Dd]enied)'
+    ))
+)
+# literals at least one of which is in every line a signature matches, str.find is
+# much faster at spotting these than a regex alternation
+agent_log_keywords = ('CRITICAL', 'ERROR', 'failed to connect', 'denied', 'Denied', 'not permitted')
+agent_log_timestamp = re.compile(r'^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d', re.M)
+
 
 class AmplifyAgentHealthCheck(Base):
     def __init__(self, **attrs):
@@ -22,11 +42,24 @@ class AmplifyAgentHealthCheck(Base):
         self.verbose = attrs['verbose']
         self.decorate_mode = attrs['decorate_mode']
         self.heading = attrs['heading']
+        self.cache_dir = attrs['cache_dir']
+        self.use_cache = attrs['use_cache']
+        self.jobs = attrs['jobs']
+        self.time_budget = attrs['time_budget']
+        self.http_pool_size = attrs['http_pool_size']
+        self.http_addresses = {}
+        self.http_lock = threading.Lock()
+        self.http = None
 
         # System
         self.sys_pkgs = attrs['system_packages']
         self.sys_find_pkg_cmd = attrs['system_find_package_command']
         self.sys_time_diff_max_allowance = attrs['system_time_diff_max_allowance']
+        self.sys_ntp_servers = attrs['system_ntp_servers']
+        self.sys_ntp_quorum = attrs['system_ntp_quorum']
+        self.sys_ntp_timeout = attrs['system_ntp_timeout']
+        self.sys_resolv_conf_file = attrs['system_resolv_conf_file']
+        self.sys_dns_timeout = attrs['system_dns_timeout']
 
         # Amplify
         self.amp_agent_path = attrs['amplify_agent_path']
@@ -34,30 +67,51 @@ class AmplifyAgentHealthCheck(Base):
         self.amp_conf_file = attrs['amplify_conf_file']
         self.amp_log_file = attrs['amplify_log_file']
         self.amp_pid_file = attrs['amplify_pid_file']
+        self.amp_log_staleness_window = attrs['amplify_log_staleness_window']
+        self.amp_log_scan_max_bytes = attrs['amplify_log_scan_max_bytes']
+        self.amp_log_scan_window = attrs['amplify_log_scan_window']
+        self.amp_receiver_url = attrs['amplify_receiver_url']
+        self.amp_receiver_timeout = attrs['amplify_receiver_timeout']
 
         self.amp_pid = None
         self.amp_owner = None
         self.amp_ps_name = None
+        self.amp_py_dists = None
+        self.site_dists = None
 
         # Nginx
         self.ngx_all_confs_path = attrs['nginx_all_confs_path']
         self.ngx_conf_file = attrs['nginx_conf_file']
+        self.ngx_conf_parse_jobs = attrs['nginx_conf_parse_jobs']
         self.ngx_status_conf_file = attrs['nginx_status_conf_file']
+        self.ngx_stub_status_interval = attrs['nginx_stub_status_interval']
+        self.ngx_stub_status_timeout = attrs['nginx_stub_status_timeout']
         self.ngx_sites_available_conf_files = attrs['nginx_sites_available_conf_files']
         self.ngx_sites_enabled_conf_files = attrs['nginx_sites_enabled_conf_files']
         self.ngx_mime_types_file = attrs['nginx_mime_types_file']
         self.ngx_log_files = attrs['nginx_log_files']
+        self.ngx_log_sample_lines = attrs['nginx_log_sample_lines']
+        self.ngx_log_sample_max_bytes = attrs['nginx_log_sample_max_bytes']
+        self.ngx_log_volume_window = attrs['nginx_log_volume_window']
+        self.ngx_log_volume_max_lines_rate = attrs['nginx_log_volume_max_lines_rate']
+        self.ngx_log_volume_max_read_bytes = attrs['nginx_log_volume_max_read_bytes']
         self.ngx_pid_file = attrs['nginx_pid_file']
         self.ngx_additional_metrics = attrs['nginx_additional_metrics']
 
-        self.ngx_conf = None
-        self.ngx_conf_blocks = []
+        self.ngx_conf_loader = ConfigLoader(self.cache_dir, self.ngx_conf_parse_jobs)
+        self.ngx_build_inspector = BuildInspector(self.cache_dir)
+        self.ngx_build_lock = threading.Lock()
+        self.ngx_build = None
         self.ngx_pid = None
         self.ngx_owner = None
-        self.ngx_worker_pid = None
-        self.ngx_worker_onwer = None
 
     def configure(self):
+        # the process table, the nginx config and the resolver are only loaded by the checks that use them
+        lazy_attribute.reset(self)
+        # addresses the HTTP checks connect to, pinned from what the resolver found
+        self.http_addresses.clear()
+        self.ngx_build = None
+
         try:
             self.amp_pid = self.read_file(self.amp_pid_file)[0]
             self.amp_owner = self.ps_owner(self.amp_pid)
@@ -65,19 +119,59 @@ class AmplifyAgentHealthCheck(Base):
 
             self.ngx_pid = self.read_file(self.ngx_pid_file)[0]
             self.ngx_owner = self.ps_owner(self.ngx_pid)
-            self.ngx_worker_pid = self.pid('nginx: worker process')[0]
-            self.ngx_worker_onwer = self.ps_owner(self.ngx_worker_pid)
-            self.ngx_conf = crossplane.parse(self.ngx_conf_file)
-
-            for config in self.ngx_conf['config']:
-                for parsed in config.get('parsed', []):
-                    for block in parsed.get('block', []):
-                        self.ngx_conf_blocks.append(block)
         except IOError, exc:
             pass
 
         return self
 
+    @lazy_attribute
+    def resolver(self):
+        # shared by the checks, so that each host is resolved once per run
+        return Resolver(read_nameservers(self.sys_resolv_conf_file), self.sys_dns_timeout)
+
+    @lazy_attribute
+    def ngx_instances(self):
+        return discover_instances(self.ps_snapshot, self.ngx_conf_file)
+
+    @lazy_attribute
+    def ngx_conf(self):
+        try:
+            return self.ngx_conf_loader.load(self.ngx_conf_file, self.use_cache)
+        except IOError:
+            return None
+
+    @lazy_attribute
+    def ngx_directives(self):
+        return index_directives(self.ngx_conf) if self.ngx_conf is not None else {}
+
+    @lazy_attribute
+    def ngx_worker_pid(self):
+        if self.ngx_pid is None:
+            return None
+
+        ngx_instance = self.ngx_instances.get(int(self.ngx_pid))
+
+        # the workers of the master in the pid file, not of whichever instance pidof finds first
+        if ngx_instance is not None:
+            ngx_worker_pids = [worker.pid for worker in ngx_instance.workers]
+        else:
+            ngx_worker_pids = self.pid('nginx: worker process')
+
+        return ngx_worker_pids[0] if ngx_worker_pids else None
+
+    @lazy_attribute
+    def ngx_worker_onwer(self):
+        return self.ps_owner(self.ngx_worker_pid) if self.ngx_worker_pid is not None else None
+
+    def report_stats(self):
+        self.pretty_print('NGINX config cache: {0} hits, {1} misses'
+                          .format(self.ngx_conf_loader.hits, self.ngx_conf_loader.misses))
+        self.pretty_print('NGINX build cache: {0} hits, {1} misses'
+                          .format(self.ngx_build_inspector.hits, self.ngx_build_inspector.misses))
+        self.pretty_print('User/group name cache: {0} hits, {1} misses'.format(
+            self.user_names.hits + self.group_names.hits, self.user_names.misses + self.group_names.misses
+        ))
+
     def generate_output(self):
         print '\n----- {0}{1}{2} -----\n'.format(self.cyan_color, self.heading, self.no_color)
 
@@ -85,28 +179,43 @@ class AmplifyAgentHealthCheck(Base):
 
         return self
 
+    @io_bound
     def verify_sys_pkgs(self, fail_count=0):
         fail_count += fail_count
+        pkg_manager = self.sys_find_pkg_cmd[0]
 
-        for pkg in self.sys_pkgs:
-            try:
-                status = call(self.sys_find_pkg_cmd + [pkg], stdout=devnull, stderr=devnull)
+        if len(self.sys_pkgs) is 0:
+            return fail_count
 
-                if status != 0:
-                    raise ValueError('{0} package {1} was NOT found'.format(self.sys_find_pkg_cmd[0], pkg))
-                elif self.verbose:
-                    self.pretty_print('{0} package {1} was found'.format(self.sys_find_pkg_cmd[0], pkg))
-            except OSError, exc:
-                fail_count += 1
-                self.pretty_print('System {} package manager is not installed'
-                                  .format(self.sys_find_pkg_cmd[0]), 'error')
-                break
-            except ValueError, exc:
+        try:
+            installed_pkgs = self.installed_sys_pkgs()
+        except OSError, exc:
+            fail_count += 1
+            self.pretty_print('System {} package manager is not installed'.format(pkg_manager), 'error')
+
+            return fail_count
+
+        for pkg in self.sys_pkgs:
+            if pkg not in installed_pkgs:
                 fail_count += 1
-                self.pretty_print(exc, 'error')
+                self.pretty_print('{0} package {1} was NOT found'.format(pkg_manager, pkg), 'error')
+            elif self.verbose:
+                self.pretty_print('{0} package {1} was found'.format(pkg_manager, pkg))
 
         return fail_count
 
+    def installed_sys_pkgs(self):
+        try:
+            return self.installed_packages(self.sys_find_pkg_cmd[0])
+        except (KeyError, CalledProcessError):
+            # unknown package manager or one that cannot list everything at once,
+            # so fall back to asking for each package separately
+            return set(
+                pkg for pkg in self.sys_pkgs
+                if call(self.sys_find_pkg_cmd + [pkg], stdout=devnull, stderr=devnull) == 0
+            )
+
+    @cpu_bound
     def verify_py_pkgs(self, fail_count=0):
         fail_count += fail_count
         pkg_path = '{}{}'.format(self.amp_agent_path, self.amp_reqs_file)
@@ -118,25 +227,48 @@ class AmplifyAgentHealthCheck(Base):
         else:
             packages = filter(None, self.read_file(pkg_path))
 
-        rgx = '[^a-zA-Z0-9.]'
+        import metadata
+
+        installed_dists = self.py_dists()
 
         for pkg in packages:
-            try:
-                required_pkg = sub(rgx, '', pkg)
-                installed_pkgs = list(pkg_resources.find_distributions('%s/amplify' % self.amp_agent_path))
-                installed_pkgs = [sub(rgx, '', str(package)) for package in installed_pkgs]
+            if pkg.lstrip().startswith('#'):
+                continue
 
-                if required_pkg not in installed_pkgs:
-                    pkg_resources.require(pkg)
+            try:
+                try:
+                    metadata.require(pkg, installed_dists)
+                except (metadata.DistributionNotFound, metadata.VersionConflict):
+                    metadata.require(pkg, installed_dists, self.site_py_dists())
 
                 if self.verbose:
                     self.pretty_print("The '{0}' distribution was found".format(pkg))
-            except (pkg_resources.DistributionNotFound, pkg_resources.VersionConflict), exc:
+            except (metadata.DistributionNotFound, metadata.VersionConflict), exc:
                 fail_count += 1
                 self.pretty_print(exc, 'error')
+            except ValueError, exc:
+                fail_count += 1
+                self.pretty_print("The '{0}' requirement is NOT valid".format(pkg), 'error')
 
         return fail_count
 
+    def py_dists(self):
+        import metadata
+
+        if self.amp_py_dists is None:
+            self.amp_py_dists = metadata.distribution_index(['%s/amplify' % self.amp_agent_path])
+
+        return self.amp_py_dists
+
+    def site_py_dists(self):
+        import metadata
+
+        if self.site_dists is None:
+            self.site_dists = metadata.distribution_index(filter(os.path.isdir, sys.path))
+
+        return self.site_dists
+
+    @io_bound
     def verify_all_packages(self):
         fail_count = 0
 
@@ -148,6 +280,7 @@ class AmplifyAgentHealthCheck(Base):
 
         return fail_count
 
+    @cpu_bound
     def verify_agent_ps(self):
         fail_count = 0
 
@@ -159,23 +292,121 @@ class AmplifyAgentHealthCheck(Base):
 
         return fail_count
 
+    @io_bound
     def verify_agent_log(self):
         fail_count = 0
+        log_filename = self.file_name(self.amp_log_file)
 
         if self.check_file(self.amp_log_file):
-            logs = self.read_file(self.amp_log_file)
+            log_stat = self.os_stat(self.amp_log_file)
+            log_age = int(time() - log_stat.st_mtime)
+
+            if log_stat.st_size > 0 and log_age <= self.amp_log_staleness_window:
+                self.pretty_print('Amplify agent {0} file exists and is being updated'.format(log_filename))
 
-            if len(logs) > 0:
-                self.pretty_print('Amplify agent {0} file exists and is being updated'.format(self.file_name(self.amp_log_file)))
+                if self.verbose:
+                    for line in self.tail_lines(self.amp_log_file, max_bytes=64 * 1024):
+                        self.pretty_print(['Amplify agent last log entry:', line])
+                        break
             else:
                 fail_count += 1
-                self.pretty_print('Amplify agent {0} file is NOT being updated'.format(self.file_name(self.amp_log_file)))
+                self.pretty_print('Amplify agent {0} file is NOT being updated (last modified {1} seconds ago)'
+                                  .format(log_filename, log_age), 'error')
         else:
             fail_count += 1
-            self.pretty_print('Amplify agent {0} file does NOT exist'.format(self.file_name(self.amp_log_file)), 'error')
+            self.pretty_print('Amplify agent {0} file does NOT exist'.format(log_filename), 'error')
+
+        return fail_count
+
+    @io_bound
+    def verify_agent_log_errors(self):
+        fail_count = 0
+        log_filename = self.file_name(self.amp_log_file)
+
+        if not self.check_file(self.amp_log_file):
+            fail_count += 1
+            self.pretty_print('Amplify agent {0} file does NOT exist'.format(log_filename), 'error')
+
+            return fail_count
+
+        counts, scanned_bytes = self.scan_agent_log()
+
+        for name, signature in agent_log_signatures:
+            if counts[name] > 0:
+                fail_count += 1
+                self.pretty_print('Amplify agent {0} file has {1} [{2}] entries'
+                                  .format(log_filename, counts[name], name), 'error')
+
+        if self.verbose:
+            self.pretty_print('Amplify agent {0} file was scanned for errors in its last {1} bytes'
+                              .format(log_filename, scanned_bytes))
+
+        if fail_count is 0:
+            self.pretty_print('Amplify agent {0} file has no errors'.format(log_filename))
 
         return fail_count
 
+    def scan_agent_log(self):
+        counts = dict((name, 0) for name, signature in agent_log_signatures)
+        scanned_bytes = 0
+        # agent log timestamps sort lexicographically, so the window boundary is compared as a string
+        window_start = strftime('%Y-%m-%d %H:%M:%S', localtime(time() - self.amp_log_scan_window)) \
+            if self.amp_log_scan_window > 0 else ''
+
+        for block in self.tail_blocks(self.amp_log_file, self.amp_log_scan_max_bytes):
+            if self.cancelled.is_set():
+                break
+
+            offset = 0
+            oldest = agent_log_timestamp.search(block)
+            window_reached = oldest is not None and oldest.group() < window_start
+
+            if window_reached:
+                offset = self.log_window_offset(block, window_start)
+
+            scanned_bytes += len(block) - offset
+            lines = set()
+
+            for keyword in agent_log_keywords:
+                position = block.find(keyword, offset)
+
+                while position != -1:
+                    line_end = block.find('\n', position)
+                    line_end = len(block) if line_end == -1 else line_end
+
+                    lines.add((block.rfind('\n', 0, position) + 1, line_end))
+                    position = block.find(keyword, line_end)
+
+            for line_start, line_end in lines:
+                line = block[line_start:line_end]
+
+                for name, signature in agent_log_signatures:
+                    if signature.search(line):
+                        counts[name] += 1
+
+            if window_reached:
+                break
+
+        return counts, scanned_bytes
+
+    def log_window_offset(self, block, window_start):
+        low, high = 0, len(block)
+
+        # binary search for the first entry logged at or after the start of the window
+        while low < high:
+            middle = (low + high) // 2
+            stamp = agent_log_timestamp.search(block, middle)
+
+            if stamp is None or stamp.group() >= window_start:
+                high = middle
+            else:
+                low = middle + 1
+
+        stamp = agent_log_timestamp.search(block, low)
+
+        return len(block) if stamp is None else stamp.start()
+
+    @cpu_bound
     def verify_agent_user(self):
         fail_count = 0
 
@@ -192,6 +423,7 @@ class AmplifyAgentHealthCheck(Base):
 
         return fail_count
 
+    @cpu_bound
     def verify_ngx_master_ps(self):
         fail_count = 0
 
@@ -216,44 +448,159 @@ class AmplifyAgentHealthCheck(Base):
 
         return fail_count
 
+    @io_bound
+    def verify_ngx_instances(self):
+        if not self.ngx_instances:
+            self.pretty_print('No NGINX master process was found', 'error')
+
+            return 1
+
+        fail_counts = CheckScheduler(self, self.jobs).map(self.check_ngx_instance, self.ngx_instances.values())
+
+        if self.verbose or len(self.ngx_instances) > 1:
+            self.pretty_print('{0} NGINX instance(s) found'.format(len(self.ngx_instances)))
+
+        return sum(fail_counts)
+
+    def check_ngx_instance(self, instance):
+        fail_count = 0
+        name = 'NGINX [master pid: {0}, config: {1}]'.format(instance.pid, instance.conf_file)
+
+        if not instance.workers:
+            fail_count += 1
+            self.pretty_print('{0} has no worker processes'.format(name), 'error')
+        else:
+            worker_owners = sorted(set(self.ps_owner(worker.pid) for worker in instance.workers))
+
+            if self.amp_owner is not None and worker_owners != [self.amp_owner]:
+                fail_count += 1
+                self.pretty_print('{0} workers run under [user: {1}], not the Amplify agent user [user: {2}]'
+                                  .format(name, ', '.join(worker_owners), self.amp_owner), 'error')
+            elif self.verbose:
+                self.pretty_print('{0} has {1} worker process(es) [user: {2}]'
+                                  .format(name, len(instance.workers), ', '.join(worker_owners)))
+
+        if self.ngx_conf is not None and instance.conf_file == self.ngx_conf_file:
+            ngx_conf = self.ngx_conf
+        else:
+            try:
+                # a loader of its own, the instances are checked concurrently
+                ngx_conf = ConfigLoader(self.cache_dir).load(instance.conf_file, self.use_cache)
+            except IOError, exc:
+                fail_count += 1
+                self.pretty_print('{0} config cannot be read: {1}'.format(name, exc.strerror or exc), 'error')
+
+                return fail_count
+
+        if ngx_conf['errors']:
+            fail_count += 1
+            error = ngx_conf['errors'][0]
+            self.pretty_print('{0} config has {1} error(s), first in {2}:{3}: {4}'.format(
+                name, len(ngx_conf['errors']), error['file'], error.get('line'), error['error']
+            ), 'error')
+        elif self.verbose:
+            self.pretty_print('{0} config parses without errors ({1} files)'.format(name, len(ngx_conf['config'])))
+
+        return fail_count
+
+    @io_bound
     def verify_sys_ps_access(self):
         fail_count = 0
-        pid_list = self.check_ps_access()
+        visible, entries = self.ps_visibility()
+        hidepid = [option for option in self.ps_snapshot.mount_options() if option.startswith('hidepid=')]
+        visibility = '{0} of {1} /proc entries readable{2}'.format(
+            visible, entries, ', /proc is mounted with ' + hidepid[0] if hidepid else ''
+        )
 
-        if self.ngx_pid is not None and int(self.ngx_pid) not in pid_list:
+        if self.ngx_pid is not None and not self.check_ps_access(self.ngx_pid):
             fail_count += 1
-            self.pretty_print('System user ID [{0}] CANNOT run ps(1) to see all system processes'
-                              .format(self.current_user()), 'error')
+            self.pretty_print('System user ID [{0}] CANNOT run ps(1) to see all system processes ({1})'
+                              .format(self.current_user(), visibility), 'error')
+        elif visible < entries:
+            self.pretty_print('System user ID [{0}] can run ps(1) but not see all system processes ({1})'
+                              .format(self.current_user(), visibility), 'warn')
         else:
             self.pretty_print('System user ID [{0}] can run ps(1) to see all system processes'.format(self.current_user()))
 
+            if self.verbose:
+                self.pretty_print('System processes visible: {0}'.format(visibility))
+
         return fail_count
 
+    @io_bound
     def verify_sys_time(self):
+        from ntp import median, query_servers
+
         fail_count = 0
+        servers = []
+        names = {}
+        addresses = [self.ntp_address(server) for server in self.sys_ntp_servers]
 
-        try:
-            client = ntplib.NTPClient()
-            res = client.request('pool.ntp.org').tx_time
+        # looked up together rather than one server after another
+        self.resolver.resolve([host for host, port in addresses if not is_address(host)])
 
-            current_ntp_time = datetime.utcfromtimestamp(res)
-            current_system_time = self.datetime_now()
+        for (host, port), name in zip(addresses, self.sys_ntp_servers):
+            address = self.resolver.address(host)
 
-            diff = abs(current_ntp_time - current_system_time)
-            diff_in_secs = diff.days * 24 * 60 * 60 + diff.seconds
+            try:
+                # left to the system resolver when ours found nothing
+                if address is None:
+                    address = socket.getaddrinfo(host, port, 0, socket.SOCK_DGRAM)[0][4][0]
+            except socket.error, exc:
+                self.pretty_print('NTP server {0} CANNOT be resolved'.format(name), 'warn')
+
+                continue
+
+            if (address, port) not in names:
+                names[(address, port)] = name
+                servers.append((address, port))
+
+        quorum = min(self.sys_ntp_quorum, len(servers))
+        samples = query_servers(servers, quorum, self.sys_ntp_timeout)
+        answered = [sample for sample in samples if sample.error is None]
+        details = ', '.join(
+            '{0} {1}'.format(names[sample.server], sample.error or '{0:+.3f}s offset, {1:.1f} ms delay'
+                             .format(sample.offset, sample.delay * 1000))
+            for sample in samples
+        )
+
+        if not answered:
+            fail_count += 1
+            self.pretty_print(['Cannot access NTP Server.', details or 'no servers'], 'warn')
 
-            if diff_in_secs > self.sys_time_diff_max_allowance:
-                fail_count += 1
-                self.pretty_print('System time is NOT set correctly. The time difference is: {0} seconds'
-                                  .format(diff_in_secs), 'error')
-            else:
-                self.pretty_print('System time is set correctly')
-        except (ntplib.NTPException, socket.gaierror), exc:
+            return fail_count
+
+        if len(answered) < quorum:
+            self.pretty_print('Only {0} of {1} NTP servers answered within {2:g}s'
+                              .format(len(answered), quorum, self.sys_ntp_timeout), 'warn')
+
+        offset = median([sample.offset for sample in answered])
+
+        if abs(offset) > self.sys_time_diff_max_allowance:
             fail_count += 1
-            self.pretty_print('Cannot access NTP Server.', 'warn')
+            self.pretty_print(['System time is NOT set correctly. The time difference is: {0:.3f} seconds'
+                               .format(abs(offset)), details], 'error')
+        else:
+            self.pretty_print('System time is set correctly (offset {0:+.3f}s, median of {1} NTP servers)'
+                              .format(offset, len(answered)))
+
+            if self.verbose:
+                self.pretty_print('NTP servers: {0}'.format(details))
 
         return fail_count
 
+    def ntp_address(self, server):
+        from ntp import ntp_port
+
+        host, sep, port = server.rpartition(':')
+
+        # a bare host name or IPv6 address uses the ntp service port
+        if not sep or ':' in host:
+            return server, ntp_port
+
+        return host, int(port)
+
+    @io_bound
     def verify_ngx_stub_status(self):
         fail_count = 0
 
@@ -261,21 +608,7 @@ class AmplifyAgentHealthCheck(Base):
         stub_status_filename = self.file_name(self.ngx_status_conf_file)
         ngx_conf_filename = self.file_name(self.ngx_conf_file)
         stub_status_module = 'http_stub_status_module'
-
-        nginx_version = Popen(['nginx', '-V'], stderr=PIPE)
-        nginx_trans = Popen(['tr', '--', '-', '\n'], stdin=nginx_version.stderr, stdout=PIPE)
-        nginx_modules = Popen(['grep', '_module'], stdin=nginx_trans.stdout, stdout=PIPE)
-        nginx_version.stderr.close()
-        output, err = nginx_modules.communicate()
-
-        nginx_modules = sub('\s+', ',', output.strip()).split(',')
-
-        included_configs = []
-
-        for block in self.ngx_conf_blocks:
-            if block['directive'] == 'include':
-                for arg in block['args']:
-                    included_configs.append(arg.split('*')[0])
+        ngx_build = self.ngx_build_info()
 
         if not stub_status_file:
             fail_count += 1
@@ -283,33 +616,159 @@ class AmplifyAgentHealthCheck(Base):
         elif self.verbose:
             self.pretty_print('NGINX {0} is configured'.format(stub_status_filename))
 
-        if self.ngx_status_conf_file.split(stub_status_filename)[0] not in included_configs:
+        if not self.ngx_included(self.ngx_status_conf_file):
             fail_count += 1
             self.pretty_print('NGINX {0} is NOT included in {1} file'
                               .format(stub_status_filename, ngx_conf_filename), 'error')
         elif self.verbose:
             self.pretty_print('NGINX {0} is included in {1} file'.format(stub_status_filename, ngx_conf_filename))
 
-        if stub_status_module not in nginx_modules:
+        if ngx_build is None:
+            fail_count += 1
+            self.pretty_print('NGINX build CANNOT be inspected with {0} -V'.format(self.ngx_binary()), 'error')
+        elif stub_status_module not in ngx_build.modules:
             fail_count += 1
             self.pretty_print('NGINX {0} is NOT included in the NGINX build'.format(stub_status_module), 'error')
         elif self.verbose:
-            self.pretty_print('NGINX {0} is included in the NGINX build'.format(stub_status_module))
+            self.pretty_print('NGINX {0} is included in the NGINX {1} build'.format(stub_status_module, ngx_build.version))
 
         if fail_count is 0 and not self.verbose:
             self.pretty_print('NGINX stub_status is configured and activated')
 
         return fail_count
 
+    @io_bound
+    def verify_ngx_stub_status_metrics(self):
+        import requests
+
+        endpoints = stub_status_endpoints(self.ngx_directives)
+
+        if not endpoints:
+            self.pretty_print('NGINX stub_status location is NOT found in {0}'
+                              .format(self.file_name(self.ngx_conf_file)), 'error')
+
+            return 1
+
+        session = self.http_session()
+
+        # the agent needs one endpoint that works, the others are only warned about
+        for endpoint in endpoints:
+            try:
+                first, first_time = self.scrape_stub_status(session, endpoint)
+
+                # cut short when the time budget runs out
+                self.cancelled.wait(self.ngx_stub_status_interval)
+
+                second, second_time = self.scrape_stub_status(session, endpoint)
+            except requests.exceptions.RequestException, exc:
+                self.pretty_print(['NGINX stub_status at {0} CANNOT be scraped'.format(endpoint.url), exc], 'warn')
+
+                continue
+
+            if first is None or second is None:
+                self.pretty_print('NGINX stub_status at {0} does NOT answer with stub_status output'
+                                  .format(endpoint.url), 'warn')
+
+                continue
+
+            return self.report_stub_status(endpoint, first, second, second_time - first_time)
+
+        self.pretty_print('NGINX stub_status metrics CANNOT be collected from {0}'
+                          .format(', '.join(endpoint.url for endpoint in endpoints)), 'error')
+
+        return 1
+
+    def scrape_stub_status(self, session, endpoint):
+        headers = {'Host': endpoint.host} if endpoint.host else {}
+        res = session.get(endpoint.url, headers=headers, timeout=self.ngx_stub_status_timeout)
+        res.raise_for_status()
+
+        return parse_stub_status(res.text), time()
+
+    def report_stub_status(self, endpoint, first, second, elapsed):
+        fail_count = 0
+
+        if second.requests < first.requests or second.accepts < first.accepts:
+            fail_count += 1
+            self.pretty_print('NGINX stub_status counters at {0} went backwards, was NGINX restarted?'
+                              .format(endpoint.url), 'error')
+
+            return fail_count
+
+        # the second scrape is a request of its own
+        rate = max(second.requests - first.requests - 1, 0) / max(elapsed, 0.001)
+        dropped = second.accepts - second.handled
+        drop_rate = float(dropped) / second.accepts if second.accepts else 0.0
+
+        self.pretty_print(
+            'NGINX stub_status at {0} reports {1:.1f} requests/s, {2} active connections '
+            '(reading {3}, writing {4}, waiting {5}), {6:.2%} of accepted connections dropped'
+            .format(endpoint.url, rate, second.active, second.reading, second.writing, second.waiting, drop_rate)
+        )
+
+        # the connection scraping it is active, whatever else is. Reading and Writing are not checked
+        # against it: they count requests, one per HTTP/2 stream, read while the workers update them
+        if second.active < 1:
+            fail_count += 1
+            self.pretty_print('NGINX stub_status at {0} reports no active connections, not even its own'
+                              .format(endpoint.url), 'error')
+
+        if dropped:
+            self.pretty_print('NGINX dropped {0} of {1} accepted connections, check worker_connections and the '
+                              'open files limit'.format(dropped, second.accepts), 'warn')
+
+        return fail_count
+
+    def ngx_binary(self):
+        from distutils.spawn import find_executable
+
+        ngx_instance = self.ngx_instances.get(int(self.ngx_pid)) if self.ngx_pid else None
+        exe = ngx_instance.master.exe if ngx_instance is not None else None
+
+        # the binary the master runs, which after an upgrade is not on disk any longer
+        if exe and not exe.endswith(' (deleted)'):
+            return exe
+
+        return find_executable('nginx') or 'nginx'
+
+    def ngx_build_info(self):
+        # nginx -V is run at most once per run, whichever check asks first
+        with self.ngx_build_lock:
+            if self.ngx_build is None:
+                self.ngx_build = self.ngx_build_inspector.inspect(self.ngx_binary(), self.use_cache)
+
+            return self.ngx_build
+
+    def ngx_prefix(self):
+        ngx_build = self.ngx_build_info()
+
+        # without nginx -V to ask, the directory of nginx.conf is the best guess
+        if ngx_build is None:
+            return os.path.dirname(self.ngx_conf_file)
+
+        return install_prefix(ngx_build.configure_args)
+
+    def ngx_directive(self, name):
+        return self.ngx_directives.get(name, [])
+
+    def ngx_included(self, file_path):
+        # the files the loader actually read, an include glob's * does not cross into subdirectories
+        loaded_files = set(os.path.realpath(conf_file) for conf_file in self.ngx_conf_files() or [])
+
+        return os.path.realpath(file_path) in loaded_files
+
+    @io_bound
     def verify_ngx_logs_read_access(self):
         fail_count = 0
         log_files = self.files(self.ngx_log_files)
 
         if len(log_files) > 0:
             for log_file in log_files:
-                if self.file_owner(log_file) != self.ngx_worker_onwer or \
-                        self.file_group(log_file) != self.ngx_owner or \
-                        not self.check_file_read_perms(log_file):
+                st = self.os_stat(log_file)
+
+                if self.file_owner(log_file, st) != self.ngx_worker_onwer or \
+                        self.file_group(log_file, st) != self.ngx_owner or \
+                        not self.check_file_read_perms(log_file, st):
                     fail_count += 1
                     self.pretty_print('NGINX {0} file is NOT readable by user {1}'
                                       .format(self.file_name(log_file), self.ngx_worker_onwer), 'error')
@@ -325,39 +784,161 @@ class AmplifyAgentHealthCheck(Base):
 
         return fail_count
 
+    @io_bound
+    def verify_ngx_log_volume(self):
+        fail_count = 0
+        first_stats = {}
+
+        for log_file in self.files(self.ngx_log_files):
+            try:
+                first_stats[log_file] = self.os_stat(log_file)
+            except OSError:
+                pass
+
+        if not first_stats:
+            fail_count += 1
+            self.pretty_print('NGINX log files were not found', 'error')
+
+            return fail_count
+
+        started = time()
+
+        # one window for all the files, however many there are, cut short by the time budget
+        self.cancelled.wait(self.ngx_log_volume_window)
+
+        elapsed = max(time() - started, 0.001)
+        total_lines_rate = total_bytes_rate = 0
+
+        for log_file, first_st in sorted(first_stats.items()):
+            try:
+                st = self.os_stat(log_file)
+            except OSError:
+                st = None
+
+            if st is None or st.st_ino != first_st.st_ino or st.st_size < first_st.st_size:
+                self.pretty_print('NGINX {0} file was rotated while it was sampled'.format(log_file), 'warn')
+
+                continue
+
+            grown = st.st_size - first_st.st_size
+
+            try:
+                lines, read_to = self.count_lines(
+                    log_file, first_st.st_size, st.st_size, self.ngx_log_volume_max_read_bytes
+                )
+            except IOError, exc:
+                self.pretty_print(['NGINX {0} file CANNOT be read'.format(log_file), exc], 'warn')
+
+                continue
+
+            # a burst bigger than what is read is estimated from the lines that were
+            if read_to - first_st.st_size < grown:
+                lines = lines * grown // max(read_to - first_st.st_size, 1)
+
+            lines_rate = lines / elapsed
+            bytes_rate = grown / elapsed
+            total_lines_rate += lines_rate
+            total_bytes_rate += bytes_rate
+
+            if lines_rate > self.ngx_log_volume_max_lines_rate:
+                self.pretty_print('NGINX {0} file grows by {1:.1f} lines/s, more than the {2:g} lines/s the agent '
+                                  'is expected to keep up with'
+                                  .format(log_file, lines_rate, self.ngx_log_volume_max_lines_rate), 'warn')
+            elif self.verbose or lines:
+                self.pretty_print('NGINX {0} file grows by {1:.1f} lines/s, {2:.1f} KB/s'
+                                  .format(log_file, lines_rate, bytes_rate / 1024))
+
+        if total_lines_rate > self.ngx_log_volume_max_lines_rate:
+            self.pretty_print('NGINX logs grow by {0:.0f} lines/s in total, more than the {1:g} lines/s the agent '
+                              'is expected to keep up with'.format(total_lines_rate, self.ngx_log_volume_max_lines_rate),
+                              'warn')
+        else:
+            self.pretty_print('NGINX logs grow by {0:.1f} lines/s, {1:.1f} KB/s in total over {2:.1f}s'
+                              .format(total_lines_rate, total_bytes_rate / 1024, elapsed))
+
+        return fail_count
+
+    @io_bound
     def verify_ngx_config_files_access(self):
         fail_count = 0
-        conf_files = self.dir_tree(self.ngx_all_confs_path)
+        conf_files = self.ngx_conf_files()
 
-        if len(conf_files) > 0:
-            for conf_file in conf_files:
-                if self.file_owner(conf_file) != self.amp_owner and \
-                        self.file_group(conf_file) != self.amp_owner and \
-                        not self.check_file_read_perms(conf_file):
-                    fail_count += 1
-                    self.pretty_print('NGINX {0} file is NOT readable by user {1}'
-                                      .format(self.file_name(conf_file), self.amp_owner), 'error')
-                elif self.verbose:
-                    self.pretty_print('NGINX {0} file is readable by user {1}'
-                                      .format(self.file_name(conf_file), self.amp_owner))
+        if conf_files is None:
+            # without a parsed config, fall back to everything under the config directory,
+            # each file stat'ed once as the walk reaches it
+            conf_entries = self.walk_files(self.ngx_all_confs_path)
         else:
+            conf_entries = (self.file_entry(conf_file) for conf_file in conf_files)
+
+        checked_files = set()
+
+        for conf_entry in conf_entries:
+            conf_file, st = conf_entry.path, conf_entry.stat
+
+            if conf_entry.error is not None:
+                fail_count += 1
+                self.pretty_print('NGINX {0} cannot be accessed: {1}'.format(conf_file, conf_entry.error), 'error')
+
+                continue
+
+            checked_files.add(os.path.realpath(conf_file))
+
+            if self.file_owner(conf_file, st) != self.amp_owner and \
+                    self.file_group(conf_file, st) != self.amp_owner and \
+                    not self.check_file_read_perms(conf_file, st):
+                fail_count += 1
+                self.pretty_print('NGINX {0} file is NOT readable by user {1}'
+                                  .format(self.file_name(conf_file), self.amp_owner), 'error')
+            elif self.verbose:
+                self.pretty_print('NGINX {0} file is readable by user {1}'
+                                  .format(self.file_name(conf_file), self.amp_owner))
+
+        if len(checked_files) is 0:
             fail_count += 1
             self.pretty_print('NGINX configuration files were not found', 'error')
 
         if fail_count is 0 and not self.verbose:
             self.pretty_print('NGINX configuration files are readable by user {0}'.format(self.amp_owner))
 
+        if self.ngx_conf is not None:
+            self.report_unused_ngx_conf_files(checked_files)
+
         return fail_count
 
+    def ngx_conf_files(self):
+        if self.ngx_conf is None or not self.ngx_conf['config']:
+            return None
+
+        # exactly the files nginx reads, includes outside of nginx_all_confs_path too
+        return [config['file'] for config in self.ngx_conf['config']]
+
+    def report_unused_ngx_conf_files(self, loaded_files):
+        unused_files = []
+
+        for conf_file in self.walk_files(self.ngx_all_confs_path, with_stat=False):
+            if conf_file.error is not None:
+                # nothing under it can be told apart from the loaded configuration
+                self.pretty_print('NGINX {0} cannot be accessed: {1}'.format(conf_file.path, conf_file.error), 'warn')
+            elif os.path.realpath(conf_file.path) not in loaded_files:
+                unused_files.append(conf_file.path)
+
+        if self.verbose:
+            for unused_file in unused_files:
+                self.pretty_print('NGINX {0} file is not part of the loaded configuration'.format(unused_file), 'warn')
+
+        if unused_files:
+            self.pretty_print('{0} file(s) under {1} are not part of the loaded configuration and were not checked'
+                              .format(len(unused_files), self.ngx_all_confs_path), 'warn')
+
+    @cpu_bound
     def verify_ngx_metrics(self):
         fail_count = 0
         current_metrics = []
 
-        for block in self.ngx_conf_blocks:
-            if block['directive'] == 'log_format':
-                for args in block['args']:
-                    for arg in args.split(' '):
-                        current_metrics.append(arg.strip())
+        for log_format in self.ngx_directive('log_format'):
+            for args in log_format.args:
+                for arg in args.split(' '):
+                    current_metrics.append(arg.strip())
 
         if len(current_metrics) > 0:
             for metrics_arg in self.ngx_additional_metrics:
@@ -378,28 +959,195 @@ class AmplifyAgentHealthCheck(Base):
 
         return fail_count
 
+    @cpu_bound
+    def verify_ngx_access_log_samples(self):
+        fail_count = 0
+        formats = log_formats(self.ngx_directives)
+        prefix = self.ngx_prefix()
+        sampled = set()
+
+        for access_log in access_logs(self.ngx_directives):
+            # nginx resolves a relative access_log path against its --prefix, not the config directory
+            log_file = os.path.join(prefix, access_log.path)
+            log_format = formats.get(access_log.format_name)
+
+            if (log_file, access_log.format_name) in sampled:
+                continue
+
+            sampled.add((log_file, access_log.format_name))
+
+            if log_format is None:
+                fail_count += 1
+                self.pretty_print('NGINX access_log {0} uses log_format {1}, which is NOT defined'
+                                  .format(access_log.path, access_log.format_name), 'error')
+
+                continue
+
+            try:
+                # the newest lines, and never more than the sample bounds however big the log is
+                chunk = self.tail_chunk(log_file, self.ngx_log_sample_lines, self.ngx_log_sample_max_bytes)
+                stats = sample_stats(log_format, [chunk])
+            except (IOError, OSError), exc:
+                self.pretty_print(['NGINX access log {0} CANNOT be sampled'.format(log_file), exc], 'warn')
+
+                continue
+
+            if stats.lines is 0:
+                self.pretty_print('NGINX access log {0} is empty, there is nothing to sample'.format(log_file), 'warn')
+
+                continue
+
+            if stats.matched is 0:
+                fail_count += 1
+                self.pretty_print('NONE of the {0} sampled lines of NGINX access log {1} match log_format {2}'
+                                  .format(stats.lines, log_file, log_format.name), 'error')
+
+                continue
+
+            self.pretty_print(
+                '{0} of {1} sampled lines of NGINX access log {2} match log_format {3} ({4:.1%})'
+                .format(stats.matched, stats.lines, log_file, log_format.name, float(stats.matched) / stats.lines),
+                'warn' if stats.matched < stats.lines else ''
+            )
+
+            missing = ', '.join(
+                '{0} {1:.0%}'.format(field, float(count) / stats.matched) for field, count in stats.missing if count
+            )
+
+            if missing and self.verbose:
+                self.pretty_print('Fields without a value in {0}: {1}'.format(log_file, missing))
+
+        return fail_count
+
+    @io_bound
     def verify_dns_resolver(self):
         "11. The system DNS resolver is correctly configured, and receiver.amplify.nginx.com can be successfully resolved."
+        fail_count = 0
+
+        if not self.resolver.nameservers:
+            self.pretty_print('No nameservers are configured in {0}'.format(self.sys_resolv_conf_file), 'error')
+
+            return 1
+
+        hosts = self.receiver_hosts()
+        answers = self.resolver.resolve(hosts)
+
+        for host in hosts:
+            addresses = [address for answer in answers[host] for address in answer.addresses]
+            latencies = ', '.join(
+                '{0} {1}'.format(self.nameserver_name(answer.nameserver), answer.error or
+                                 '{0:.1f} ms'.format(answer.latency * 1000))
+                for answer in answers[host]
+            )
+
+            if not addresses:
+                fail_count += 1
+                self.pretty_print('{0} CANNOT be resolved ({1})'.format(host, latencies), 'error')
+            elif any(answer.error for answer in answers[host]):
+                self.pretty_print('{0} resolves to {1}, but not by every nameserver ({2})'
+                                  .format(host, addresses[0], latencies), 'warn')
+            else:
+                self.pretty_print('{0} resolves to {1} ({2})'.format(host, addresses[0], latencies))
+
+        return fail_count
 
+    def nameserver_name(self, nameserver):
+        address, port = nameserver
+
+        return address if port == 53 else '{0}:{1}'.format(address, port)
+
+    def receiver_urls(self):
+        urls = [self.amp_receiver_url]
+        agent_conf = ConfigParser.RawConfigParser()
+
+        try:
+            agent_conf.read(self.amp_conf_file)
+        except ConfigParser.Error:
+            pass
+
+        # i.e. api_url in the [cloud] section
+        for section in agent_conf.sections():
+            for option, value in agent_conf.items(section):
+                if option.endswith('_url') and value:
+                    urls.append(value)
+
+        return [url for i, url in enumerate(urls) if url not in urls[:i]]
+
+    def receiver_hosts(self):
+        hosts = [urlparse(url).hostname for url in self.receiver_urls()]
+
+        return [host for i, host in enumerate(hosts) if host and host not in hosts[:i]]
+
+    def http_session(self):
+        from network import http_session
+
+        # one pool for every HTTP check, so a host several of them talk to is connected to once
+        with self.http_lock:
+            if self.http is None:
+                self.http = http_session(self.http_addresses, self.http_pool_size)
+
+            return self.http
+
+    def http_timings(self, timings, host):
+        answer = self.resolver.answer(host)
+        parts = []
+
+        if answer is not None:
+            parts.append('dns {0:.1f} ms'.format(answer.latency * 1000))
+
+        if timings.reused:
+            parts.append('connection reused')
+        else:
+            parts.append('connect {0:.1f} ms'.format(timings.connect * 1000))
+
+            if timings.tls:
+                parts.append('tls {0:.1f} ms'.format(timings.tls * 1000))
+
+        if timings.first_byte is not None:
+            parts.append('first byte {0:.1f} ms'.format(timings.first_byte * 1000))
+
+        return ', '.join(parts)
+
+    @io_bound
     def verify_outbound_tls_access(self):
+        import requests
+
         fail_count = 0
+        session = self.http_session()
 
-        try:
-            res = requests.get('https://receiver.amplify.nginx.com:443/ping')
-            res.raise_for_status()
+        for url in self.receiver_urls():
+            host = urlparse(url).hostname
 
-            self.pretty_print('Outbound TLS/SSL from the system to receiver.amplify.nginx.com is accessible')
-        except requests.exceptions.RequestException, exc:
-            fail_count += 1
-            self.pretty_print(
-                ['Outbound TLS/SSL from the system to receiver.amplify.nginx.com IS restricted', exc],
-                'error'
-            )
+            # reuse the address verify_dns_resolver resolved, if none was found leave it to the system resolver
+            address = self.resolver.address(host) if host else None
+
+            if address is not None:
+                self.http_addresses[host] = address
+
+            try:
+                res = session.get(url, timeout=self.amp_receiver_timeout)
+
+                # any response from the API will do, only the receiver ping has to succeed
+                if url == self.amp_receiver_url:
+                    res.raise_for_status()
+            except requests.exceptions.RequestException, exc:
+                fail_count += 1
+                self.pretty_print(['Outbound TLS/SSL from the system to {0} IS restricted'.format(url), exc], 'error')
+
+                continue
+
+            timings = getattr(res, 'timings', None)
+
+            self.pretty_print('Outbound TLS/SSL from the system to {0} is accessible{1}'.format(
+                url, ' ({0})'.format(self.http_timings(timings, host)) if timings is not None else ''
+            ))
 
         return fail_count
 
+    @io_bound
     def verify_metrics_collection(self):
         "13. selinux(8), apparmor(7) or grsecurity are not interfering with the metric collection. E.g. for selinux(8) check /etc/selinux/config, try setenforce 0 temporarily and see if it improves the situation for certain metrics."
 
+    @io_bound
     def verify_proc_sys_access(self):
         "14. Some VPS providers use hardened Linux kernels that may restrict non-root users from accessing /proc and /sys. Metrics describing system and NGINX disk I/O are usually affected. There is no an easy workaround for this except for allowing the agent to run as root. Sometimes fixing permissions for /proc and /sys/block may work."
@@ -0,0 +1,182 @@
+import re
+import io
+
+from collections import namedtuple
+
+# built into nginx, used by access_log directives that name no format
+combined_format = (
+    '$remote_addr - $remote_user [$time_local] "$request" $status $body_bytes_sent "$http_referer" "$http_user_agent"'
+)
+
+variable_pattern = re.compile(r'\$(?:\{(\w+)\}|(\w+))')
+
+# one value per upstream tried, joined with ", ", and " : " across internal redirects
+multi_value_fields = frozenset([
+    'upstream_addr', 'upstream_status', 'upstream_connect_time', 'upstream_header_time', 'upstream_response_time',
+    'upstream_response_length', 'upstream_bytes_received', 'upstream_bytes_sent'
+])
+multi_value_pattern = r'([^\s,]*(?:(?:, | : )[^\s,]*)*)'
+
+# fields are the variable names in the order they appear, regex has a group for each
+LogFormat = namedtuple('LogFormat', ['name', 'format', 'fields', 'regex'])
+
+AccessLog = namedtuple('AccessLog', ['path', 'format_name', 'file', 'line'])
+
+# missing pairs each field with the number of matched lines it had no value in
+SampleStats = namedtuple('SampleStats', ['lines', 'matched', 'missing'])
+
+
+def format_string(args):
+    # log_format name [escape=default|json|none] string ...
+    strings = [arg for arg in args[1:] if not arg.startswith('escape=')]
+
+    # nginx concatenates the strings as they are, without adding any separator
+    return ''.join(strings)
+
+
+def compile_format(name, format):
+    fields = []
+    pattern = []
+    position = 0
+    matches = list(variable_pattern.finditer(format))
+
+    for i, match in enumerate(matches):
+        pattern.append(re.escape(format[position:match.start()]))
+        fields.append(match.group(1) or match.group(2))
+        position = match.end()
+
+        next_start = matches[i + 1].start() if i + 1 < len(matches) else len(format)
+        literal = format[position:next_start]
+
+        if fields[-1] in multi_value_fields and literal[:1] in (' ', ',', ':'):
+            # only where the separators could be taken for the end of the value, a quoted one runs to the quote
+            pattern.append(multi_value_pattern)
+        elif len(literal) > 1:
+            # a value runs up to where the whole literal after it follows, so it may hold the literal's
+            # first character, and never past the end of the line
+            pattern.append('([^{0}\\n]*(?:{0}(?!{1})[^{0}\\n]*)*)'.format(re.escape(literal[0]), re.escape(literal[1:])))
+        elif literal:
+            pattern.append('([^{0}\\n]*)'.format(re.escape(literal)))
+        elif i + 1 < len(matches):
+            pattern.append('(.*?)')
+        else:
+            pattern.append('(.*)')
+
+    pattern.append(re.escape(format[position:]))
+
+    # multiline, so that the same regex finds the lines in a whole chunk of a log
+    return LogFormat(name, format, tuple(fields), re.compile('^' + ''.join(pattern) + '$', re.M))
+
+
+def log_formats(directives):
+    formats = {'combined': compile_format('combined', combined_format)}
+
+    for directive in directives.get('log_format', []):
+        if len(directive.args) > 1:
+            formats[directive.args[0]] = compile_format(directive.args[0], format_string(directive.args))
+
+    return formats
+
+
+def access_logs(directives):
+    logs = []
+
+    for directive in directives.get('access_log', []):
+        args = directive.args
+
+        # off, syslog and paths built from variables cannot be sampled
+        if not args or args[0] == 'off' or args[0].startswith('syslog:') or '$' in args[0]:
+            continue
+
+        format_name = args[1] if len(args) > 1 and '=' not in args[1] else 'combined'
+        logs.append(AccessLog(args[0], format_name, directive.file, directive.line))
+
+    return logs
+
+
+def is_missing(value):
+    # nginx logs a variable without a value as a dash
+    return value == '-' or value == ''
+
+
+def sample_stats(log_format, chunks):
+    parser = LogParser(log_format)
+    missing = [0] * len(log_format.fields)
+
+    for record in parser.parse_chunks(chunks):
+        for i, value in enumerate(record.match.groups()):
+            if is_missing(value):
+                missing[i] += 1
+
+    return SampleStats(parser.lines, parser.matched, tuple(zip(log_format.fields, missing)))
+
+
+class Record(object):
+    __slots__ = ('match', 'groups')
+
+    def __init__(self, match, groups):
+        self.match = match
+        self.groups = groups
+
+    def __getitem__(self, field):
+        # only the fields asked for are copied out of the chunk
+        return self.match.group(self.groups[field])
+
+    def get(self, field, default=None):
+        group = self.groups.get(field)
+
+        return default if group is None else self.match.group(group)
+
+
+class LogParser(object):
+    def __init__(self, log_format, chunk_size=4 << 20):
+        self.log_format = log_format
+        self.chunk_size = chunk_size
+        # the first group of a field that appears more than once
+        self.groups = dict(reversed([(field, i + 1) for i, field in enumerate(log_format.fields)]))
+        self.lines = 0
+        self.matched = 0
+        self.bytes = 0
+
+    def chunks(self, f):
+        rest = ''
+
+        while True:
+            data = f.read(self.chunk_size)
+
+            if not data:
+                break
+
+            # a chunk ends on the last full line, the part after it goes with the next one
+            end = data.rfind('\n') + 1
+
+            if end is 0:
+                rest += data
+
+                continue
+
+            yield rest + data[:end] if rest else data[:end]
+
+            rest = data[end:]
+
+        if rest:
+            yield rest + '\n'
+
+    def parse_chunks(self, chunks):
+        finditer = self.log_format.regex.finditer
+        groups = self.groups
+
+        for chunk in chunks:
+            self.bytes += len(chunk)
+            self.lines += chunk.count('\n')
+
+            # matched where the lines are in the chunk, rather than split into strings first
+            for match in finditer(chunk):
+                self.matched += 1
+
+                yield Record(match, groups)
+
+    def parse_file(self, file_path):
+        with io.open(file_path, 'rb', buffering=0) as f:
+            for record in self.parse_chunks(self.chunks(f)):
+                yield record
@@ -0,0 +1,113 @@
+import os
+import re
+
+from packaging.requirements import Requirement
+from packaging.utils import canonicalize_name
+
+metadata_files = {
+    '.dist-info': 'METADATA',
+    '.egg-info': 'PKG-INFO'
+}
+
+
+class DistributionNotFound(Exception):
+    def __init__(self, requirement):
+        super(DistributionNotFound, self).__init__(
+            "The '{0}' distribution was not found and is required by the application".format(requirement)
+        )
+
+
+class VersionConflict(Exception):
+    def __init__(self, dist, requirement):
+        super(VersionConflict, self).__init__(
+            "The '{0}' distribution was found as {1} {2} in {3}".format(
+                requirement, dist.project_name, dist.version, dist.location
+            )
+        )
+
+
+class Distribution(object):
+    __slots__ = ('project_name', 'version', 'location')
+
+    def __init__(self, project_name, version, location):
+        self.project_name = project_name
+        self.version = version
+        self.location = location
+
+    @property
+    def key(self):
+        return canonicalize_name(self.project_name)
+
+    def __repr__(self):
+        return '{0} {1}'.format(self.project_name, self.version)
+
+
+def read_headers(metadata_path):
+    headers = {}
+
+    with open(metadata_path) as f:
+        for line in f:
+            if not line.strip():
+                break
+
+            name, sep, value = line.partition(':')
+
+            if sep and name in ('Name', 'Version'):
+                headers[name] = value.strip()
+
+    return headers
+
+
+def find_distributions(path):
+    try:
+        entries = os.listdir(path)
+    except OSError:
+        return
+
+    for entry in entries:
+        base, ext = os.path.splitext(entry)
+
+        if ext not in metadata_files:
+            continue
+
+        entry_path = os.path.join(path, entry)
+        metadata_path = entry_path
+
+        # egg-info can be a single PKG-INFO file instead of a directory
+        if os.path.isdir(entry_path):
+            metadata_path = os.path.join(entry_path, metadata_files[ext])
+
+        try:
+            headers = read_headers(metadata_path)
+        except IOError:
+            headers = {}
+
+        # fall back to the name-version[-pyX.Y] encoded in the directory name
+        name, sep, version = re.sub('-py\d.*$', '', base).partition('-')
+
+        yield Distribution(headers.get('Name', name), headers.get('Version', version), path)
+
+
+def distribution_index(paths):
+    index = {}
+
+    for path in paths:
+        for dist in find_distributions(path):
+            index.setdefault(dist.key, dist)
+
+    return index
+
+
+def require(requirement, *indexes):
+    requirement = Requirement(requirement)
+    key = canonicalize_name(requirement.name)
+    found = [index[key] for index in indexes if key in index]
+
+    for dist in found:
+        if requirement.specifier.contains(dist.version, prereleases=True):
+            return dist
+
+    if found:
+        raise VersionConflict(found[0], requirement)
+
+    raise DistributionNotFound(requirement)
@@ -0,0 +1,187 @@
+import errno
+import select
+import socket
+import requests
+
+from collections import namedtuple
+from time import time
+from urlparse import urlparse
+from requests.adapters import HTTPAdapter
+from requests.utils import select_proxy
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+default_ports = {'http': 80, 'https': 443}
+
+# seconds, connect and tls are 0 on a reused connection, and tls is 0 without TLS
+Timings = namedtuple('Timings', ['connect', 'tls', 'first_byte', 'reused'])
+
+
+class TimedConnection(object):
+    timings = None
+    sent = None
+
+    def _new_conn(self):
+        started = time()
+        conn = super(TimedConnection, self)._new_conn()
+        self.timings = {'connect': time() - started, 'tls': 0}
+
+        return conn
+
+    def request(self, *args, **kwargs):
+        super(TimedConnection, self).request(*args, **kwargs)
+        self.sent = time()
+
+    def getresponse(self, *args, **kwargs):
+        response = super(TimedConnection, self).getresponse(*args, **kwargs)
+
+        if self.sent is not None:
+            self.timings = dict(self.timings or {}, first_byte=time() - self.sent)
+
+        return response
+
+    def take_timings(self):
+        timings = self.timings or {}
+        # whatever comes next on this connection is a reuse
+        self.timings = None
+
+        return Timings(
+            timings.get('connect', 0), timings.get('tls', 0), timings.get('first_byte'), 'connect' not in timings
+        )
+
+
+class TimedHTTPConnection(TimedConnection, HTTPConnection):
+    pass
+
+
+class TimedHTTPSConnection(TimedConnection, HTTPSConnection):
+    def connect(self):
+        started = time()
+        super(TimedHTTPSConnection, self).connect()
+
+        # the handshake is whatever connect() spent after the TCP connection was made
+        self.timings['tls'] = max(time() - started - self.timings['connect'], 0)
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TimedAdapter(HTTPAdapter):
+    def __init__(self, addresses=None, *args, **kwargs):
+        # host name -> address it was already resolved to
+        self.addresses = {} if addresses is None else addresses
+
+        super(TimedAdapter, self).__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super(TimedAdapter, self).init_poolmanager(*args, **kwargs)
+
+        self.poolmanager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+
+    def get_connection(self, url, proxies=None):
+        parsed = urlparse(url)
+        address = self.addresses.get(parsed.hostname)
+
+        if address is None or select_proxy(url, proxies):
+            return super(TimedAdapter, self).get_connection(url, proxies)
+
+        pool_kwargs = {}
+
+        # connect to the address, but still send the name for SNI and verify the certificate against it
+        if parsed.scheme == 'https':
+            pool_kwargs = {'server_hostname': parsed.hostname, 'assert_hostname': parsed.hostname}
+
+        return self.poolmanager.connection_from_host(
+            address, parsed.port or default_ports.get(parsed.scheme), parsed.scheme, pool_kwargs=pool_kwargs
+        )
+
+    def send(self, request, **kwargs):
+        parsed = urlparse(request.url)
+
+        if parsed.hostname in self.addresses:
+            request.headers.setdefault('Host', parsed.netloc)
+
+        return super(TimedAdapter, self).send(request, **kwargs)
+
+    def build_response(self, req, resp):
+        response = super(TimedAdapter, self).build_response(req, resp)
+        # the connection is only handed over while the body has not been read
+        connection = getattr(resp, '_connection', None)
+
+        response.timings = connection.take_timings() if isinstance(connection, TimedConnection) else None
+
+        return response
+
+
+def http_session(addresses=None, pool_size=10):
+    session = requests.Session()
+    adapter = TimedAdapter(addresses, pool_connections=pool_size, pool_maxsize=pool_size)
+
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    return session
+
+
+def udp_exchange(peers, datagrams, on_reply, timeout, done=None, bufsize=4096):
+    # every peer is sent its datagrams at once, and each reply is handed to on_reply, which returns
+    # True once nothing more is expected from that peer; returns the peers that failed, with why
+    errors = {}
+    sockets = {}
+
+    for peer in peers:
+        family = socket.AF_INET6 if ':' in peer[0] else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_DGRAM)
+        sock.setblocking(0)
+
+        try:
+            # connected, so only the peer's own replies are received
+            sock.connect(peer)
+            sockets[sock] = peer
+
+            for datagram in datagrams(peer):
+                sock.send(datagram)
+        except socket.error, exc:
+            errors[peer] = exc.strerror or str(exc)
+            sockets.pop(sock, None)
+            sock.close()
+
+    deadline = time() + timeout
+
+    try:
+        while sockets and not (done and done()):
+            remaining = deadline - time()
+
+            if remaining <= 0:
+                break
+
+            readable, writable, errored = select.select(list(sockets), [], [], remaining)
+
+            for sock in readable:
+                peer = sockets[sock]
+
+                try:
+                    data = sock.recv(bufsize)
+                except socket.error, exc:
+                    # i.e. an ICMP port unreachable for a peer not listening
+                    if exc.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        continue
+
+                    errors[peer] = exc.strerror or str(exc)
+                    finished = True
+                else:
+                    finished = on_reply(peer, data)
+
+                if finished:
+                    del sockets[sock]
+                    sock.close()
+    finally:
+        for sock in sockets:
+            sock.close()
+
+    return errors
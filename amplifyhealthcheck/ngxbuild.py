@@ -0,0 +1,119 @@
+import os
+import shlex
+
+from collections import namedtuple
+from subprocess import Popen, PIPE
+from base import marshal_cache_file, read_marshal_cache, write_marshal_cache
+
+# bump whenever the layout of the cached entries changes
+cache_version = 2
+
+# configure_args is a tuple of the ./configure arguments, modules a frozenset of the
+# module names built in, i.e. http_stub_status_module
+Build = namedtuple('Build', ['version', 'configure_args', 'modules'])
+
+# where nginx looks for relative paths when it was configured without --prefix
+default_prefix = '/usr/local/nginx'
+
+
+def module_name(arg):
+    option, sep, value = arg.partition('=')
+
+    # --with-http_stub_status_module, --with-stream_ssl_module=dynamic
+    if option.startswith('--with-') and option.endswith('_module'):
+        return option[len('--with-'):]
+
+    # third party modules by the directory they were built from, i.e. ngx_devel_kit
+    if option in ('--add-module', '--add-dynamic-module') and value:
+        return os.path.basename(value.rstrip('/'))
+
+    return None
+
+
+def install_prefix(configure_args):
+    for arg in configure_args:
+        if arg.startswith('--prefix='):
+            return arg[len('--prefix='):]
+
+    return default_prefix
+
+
+def parse_version_output(output):
+    version = None
+    configure_args = ()
+
+    for line in output.splitlines():
+        if line.startswith('nginx version:'):
+            # nginx/1.25.3, or nginx/1.21.6 (nginx-plus-r27)
+            version = line.split(':', 1)[1].strip().partition('/')[2].split(' ')[0] or None
+        elif line.startswith('configure arguments:'):
+            try:
+                configure_args = tuple(shlex.split(line.split(':', 1)[1]))
+            except ValueError:
+                configure_args = tuple(line.split(':', 1)[1].split())
+
+    modules = frozenset(name for name in (module_name(arg) for arg in configure_args) if name)
+
+    return Build(version, configure_args, modules)
+
+
+class BuildInspector(object):
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+
+    def cache_file(self, binary):
+        return marshal_cache_file(self.cache_dir, 'nginx-build', binary)
+
+    def binary_key(self, binary):
+        try:
+            st = os.stat(binary)
+        except OSError:
+            return None
+
+        # an upgrade replaces the binary, which changes at least one of these
+        return os.path.abspath(binary), st.st_ino, st.st_mtime
+
+    def read_cache(self, binary, key):
+        # the binary key is part of the version, an upgraded binary never matches
+        entry = read_marshal_cache(self.cache_file(binary), (cache_version, key))
+
+        try:
+            return Build(entry[0], tuple(entry[1]), frozenset(entry[2]))
+        except (TypeError, IndexError):
+            return None
+
+    def write_cache(self, binary, key, build):
+        entry = [build.version, list(build.configure_args), sorted(build.modules)]
+        write_marshal_cache(self.cache_file(binary), (cache_version, key), entry)
+
+    def inspect(self, binary, use_cache=True):
+        key = self.binary_key(binary)
+        use_cache = use_cache and self.cache_dir and key is not None
+
+        if use_cache:
+            build = self.read_cache(binary, key)
+
+            if build is not None:
+                self.hits += 1
+
+                return build
+
+        self.misses += 1
+
+        try:
+            # nginx -V writes to stderr
+            output, err = Popen([binary, '-V'], stdout=PIPE, stderr=PIPE).communicate()
+        except OSError:
+            return None
+
+        build = parse_version_output(err or output)
+
+        if build.version is None:
+            return None
+
+        if use_cache:
+            self.write_cache(binary, key, build)
+
+        return build
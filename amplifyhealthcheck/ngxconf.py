@@ -0,0 +1,236 @@
+import os
+import glob
+
+from collections import namedtuple
+from base import marshal_cache_file, read_marshal_cache, write_marshal_cache
+
+# bump whenever the layout of the cached entries changes
+cache_version = 2
+
+# below this many files a process pool costs more than it saves
+parallel_parse_min_files = 32
+
+# parents are the enclosing block directives, outermost first
+Directive = namedtuple('Directive', ['name', 'file', 'line', 'args', 'parents'])
+
+
+def parse_file(file_path):
+    import crossplane
+
+    # includes are resolved by the loader, and the context of an included file is only
+    # known from the file including it, so context_errors checks it once the includes are
+    return crossplane.parse(file_path, single=True, check_ctx=False)['config'][0]
+
+
+def parse_file_batch(file_paths):
+    return [parse_file(file_path) for file_path in file_paths]
+
+
+def statements(parsed):
+    for statement in parsed:
+        yield statement
+
+        for child in statements(statement.get('block', [])):
+            yield child
+
+
+class ConfigLoader(object):
+    def __init__(self, cache_dir=None, jobs=1):
+        self.cache_dir = cache_dir
+        self.jobs = jobs
+        self.pool = None
+        self.cache = {}
+        self.hits = 0
+        self.misses = 0
+
+    def cache_file(self, conf_file):
+        return marshal_cache_file(self.cache_dir, 'nginx-conf', conf_file)
+
+    def read_cache(self, conf_file):
+        import crossplane
+
+        cache = read_marshal_cache(self.cache_file(conf_file), (cache_version, crossplane.__version__))
+        self.cache = cache if isinstance(cache, dict) else {}
+
+    def write_cache(self, conf_file, files):
+        import crossplane
+
+        write_marshal_cache(self.cache_file(conf_file), (cache_version, crossplane.__version__), files)
+
+    def file_key(self, file_path):
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+
+        return st.st_ino, st.st_mtime, st.st_size
+
+    def parse_files(self, file_paths):
+        keys = [self.file_key(file_path) for file_path in file_paths]
+        configs = []
+        misses = []
+
+        for file_path, key in zip(file_paths, keys):
+            cached = self.cache.get(file_path)
+
+            if key is not None and cached is not None and tuple(cached[0]) == key:
+                configs.append(cached[1])
+            else:
+                configs.append(None)
+                misses.append(len(configs) - 1)
+
+        self.hits += len(configs) - len(misses)
+        self.misses += len(misses)
+
+        for i, config in zip(misses, self.parse_misses([file_paths[i] for i in misses])):
+            configs[i] = config
+
+        return zip(keys, configs)
+
+    def parse_misses(self, file_paths):
+        if self.jobs <= 1 or len(file_paths) < parallel_parse_min_files:
+            return [parse_file(file_path) for file_path in file_paths]
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.jobs)
+
+        # a few batches per worker keeps the pickling overhead low and the workers busy
+        batch_size = -(-len(file_paths) // (self.jobs * 4))
+        batches = [file_paths[i:i + batch_size] for i in range(0, len(file_paths), batch_size)]
+
+        return [config for batch in self.pool.map(parse_file_batch, batches) for config in batch]
+
+    def resolve_includes(self, config, conf_path, included, file_paths):
+        for statement in statements(config['parsed']):
+            if statement['directive'] != 'include' or not statement['args']:
+                continue
+
+            pattern = statement['args'][0]
+            statement['includes'] = []
+
+            if not os.path.isabs(pattern):
+                pattern = os.path.join(conf_path, pattern)
+
+            if glob.has_magic(pattern):
+                include_files = sorted(glob.glob(pattern))
+            else:
+                try:
+                    # nginx fails on an explicit include it cannot read
+                    open(str(pattern)).close()
+                    include_files = [pattern]
+                except IOError, exc:
+                    include_files = []
+                    config['status'] = 'failed'
+                    config['errors'].append({'error': str(exc), 'line': statement['line']})
+
+            for include_file in include_files:
+                if include_file not in included:
+                    included[include_file] = len(included)
+                    file_paths.append(include_file)
+
+                statement['includes'].append(included[include_file])
+
+    def load(self, conf_file, use_cache=True):
+        if use_cache and self.cache_dir:
+            self.read_cache(conf_file)
+
+        conf_path = os.path.dirname(conf_file)
+        payload = {'status': 'ok', 'errors': [], 'config': []}
+        included = {conf_file: 0}
+        files = {}
+        file_paths = [conf_file]
+
+        # breadth first, which numbers the included files the same way crossplane.parse does
+        # and hands a whole level of the include fan-out to parse_files at once
+        try:
+            while file_paths:
+                next_file_paths = []
+
+                for file_path, (key, config) in zip(file_paths, self.parse_files(file_paths)):
+                    if key is not None:
+                        files[file_path] = (key, config)
+
+                    # included errors are added on each run, cache only what the file itself produced
+                    config = dict(config, errors=list(config['errors']))
+                    self.resolve_includes(config, conf_path, included, next_file_paths)
+
+                    for error in config['errors']:
+                        payload['status'] = 'failed'
+                        payload['errors'].append(dict(error, file=file_path))
+
+                    payload['config'].append(config)
+
+                file_paths = next_file_paths
+        finally:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+
+        if use_cache and self.cache_dir:
+            self.write_cache(conf_file, files)
+
+        for error in context_errors(payload['config']):
+            payload['status'] = 'failed'
+            payload['errors'].append(error)
+
+        return payload
+
+
+def context_errors(configs):
+    from crossplane.analyzer import analyze, enter_block_ctx
+    from crossplane.errors import NgxParserDirectiveContextError
+
+    errors = []
+    seen = set()
+
+    def walk(parsed, file_path, ctx, included):
+        for statement in parsed:
+            try:
+                analyze(file_path, statement, '{' if 'block' in statement else ';', ctx, check_args=False)
+            except NgxParserDirectiveContextError, exc:
+                # a file included from several places is reported once for each context it is wrong in
+                if (file_path, exc.lineno, exc.strerror) not in seen:
+                    seen.add((file_path, exc.lineno, exc.strerror))
+                    errors.append({'file': file_path, 'line': exc.lineno, 'error': str(exc)})
+
+            # included files are checked in the context of the include directive
+            for config_index in statement.get('includes', []):
+                if config_index not in included:
+                    config = configs[config_index]
+                    walk(config.get('parsed', []), config['file'], ctx, included | frozenset([config_index]))
+
+            if 'block' in statement:
+                walk(statement['block'], file_path, enter_block_ctx(statement, ctx), included)
+
+    if configs:
+        walk(configs[0].get('parsed', []), configs[0]['file'], (), frozenset([0]))
+
+    return errors
+
+
+def index_directives(payload):
+    index = {}
+    configs = payload.get('config', [])
+
+    def walk(parsed, file_path, parents, included):
+        for statement in parsed:
+            directive = Directive(
+                statement['directive'], file_path, statement.get('line'), tuple(statement.get('args', [])), parents
+            )
+            index.setdefault(directive.name, []).append(directive)
+
+            # included files inherit the context of the include directive
+            for config_index in statement.get('includes', []):
+                if config_index not in included:
+                    config = configs[config_index]
+                    walk(config.get('parsed', []), config['file'], parents, included | frozenset([config_index]))
+
+            if 'block' in statement:
+                walk(statement['block'], file_path, parents + (directive,), included)
+
+    if configs:
+        walk(configs[0].get('parsed', []), configs[0]['file'], (), frozenset([0]))
+
+    return index
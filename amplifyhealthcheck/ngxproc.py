@@ -0,0 +1,73 @@
+import os
+
+from collections import OrderedDict
+
+master_title = 'nginx: master process'
+worker_title = 'nginx: worker process'
+
+
+class Instance(object):
+    __slots__ = ('master', 'workers', 'conf_file')
+
+    def __init__(self, master, workers, conf_file):
+        self.master = master
+        self.workers = workers
+        self.conf_file = conf_file
+
+    @property
+    def pid(self):
+        return self.master.pid
+
+    def __repr__(self):
+        return 'nginx({0}, {1})'.format(self.master.pid, self.conf_file)
+
+
+def title(process):
+    return ' '.join(process.cmdline)
+
+
+def conf_file_from_cmdline(cmdline, default_conf_file):
+    # the master rewrites its argv into a single title, i.e.
+    # 'nginx: master process /usr/sbin/nginx -p /srv/nginx -c conf/nginx.conf'
+    args = ' '.join(cmdline)[len(master_title):].split()
+    conf_file = prefix = None
+
+    for i, arg in enumerate(args):
+        for option in ('-c', '-p'):
+            if arg == option and i + 1 < len(args):
+                value = args[i + 1]
+            elif arg.startswith(option) and len(arg) > len(option):
+                value = arg[len(option):]
+            else:
+                continue
+
+            if option == '-c':
+                conf_file = value
+            else:
+                prefix = value
+
+    if conf_file is None:
+        return default_conf_file
+
+    if prefix is not None and not os.path.isabs(conf_file):
+        conf_file = os.path.join(prefix, conf_file)
+
+    return conf_file
+
+
+def discover_instances(snapshot, default_conf_file):
+    instances = OrderedDict()
+
+    for pid in snapshot.pids():
+        master = snapshot.process(pid)
+
+        if not title(master).startswith(master_title):
+            continue
+
+        # after a binary upgrade the new master is a child of the old one,
+        # so only the worker processes are taken from the children
+        workers = [child for child in snapshot.children(pid) if title(child).startswith(worker_title)]
+
+        instances[pid] = Instance(master, workers, conf_file_from_cmdline(master.cmdline, default_conf_file))
+
+    return instances
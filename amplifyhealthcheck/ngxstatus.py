@@ -0,0 +1,88 @@
+import re
+
+from collections import namedtuple
+
+stub_status_pattern = re.compile(
+    r'Active connections:\s*(\d+)\s+'
+    r'server accepts handled requests\s+(\d+)\s+(\d+)\s+(\d+)\s+'
+    r'Reading:\s*(\d+)\s+Writing:\s*(\d+)\s+Waiting:\s*(\d+)'
+)
+
+StubStatus = namedtuple(
+    'StubStatus', ['active', 'accepts', 'handled', 'requests', 'reading', 'writing', 'waiting']
+)
+
+# host is None when the server takes the request whatever its Host header
+Endpoint = namedtuple('Endpoint', ['url', 'host', 'file', 'line'])
+
+
+def parse_stub_status(text):
+    match = stub_status_pattern.search(text)
+
+    if match is None:
+        return None
+
+    return StubStatus(*[int(value) for value in match.groups()])
+
+
+def is_plain_name(name):
+    # not the catch-all, a wildcard, a regex or a .suffix name
+    return bool(name) and name != '_' and name[0] not in '~.' and '*' not in name
+
+
+def listen_address(args):
+    address = args[0] if args else '80'
+    scheme = 'https' if 'ssl' in args[1:] else 'http'
+
+    if address.startswith('unix:'):
+        return None
+
+    if address.startswith('['):
+        host, sep, port = address[1:].partition(']')
+        port = port.lstrip(':') or '80'
+        host = '::1' if host == '::' else host
+        host = '[{0}]'.format(host)
+    elif address.isdigit():
+        host, port = '127.0.0.1', address
+    else:
+        host, sep, port = address.partition(':')
+        port = port or '80'
+
+    # a wildcard listen is reachable on the loopback address
+    if host in ('*', '0.0.0.0'):
+        host = '127.0.0.1'
+
+    return '{0}://{1}:{2}'.format(scheme, host, port)
+
+
+def stub_status_endpoints(directives):
+    endpoints = []
+
+    for stub_status in directives.get('stub_status', []):
+        if stub_status.args[:1] == ('off',):
+            continue
+
+        locations = [parent for parent in stub_status.parents if parent.name == 'location']
+        servers = [i for i, parent in enumerate(stub_status.parents) if parent.name == 'server']
+
+        # regex locations have no path of their own to ask for
+        if not locations or not servers or locations[-1].args[0] in ('~', '~*'):
+            continue
+
+        server_parents = stub_status.parents[:servers[-1] + 1]
+        listens = [directive for directive in directives.get('listen', []) if directive.parents == server_parents]
+        server_names = [
+            name for directive in directives.get('server_name', []) if directive.parents == server_parents
+            for name in directive.args
+        ]
+        # a plain name is sent as the Host header, so that the right server answers
+        host = next((name for name in server_names if is_plain_name(name)), None)
+        path = locations[-1].args[-1]
+
+        for listen in listens or [None]:
+            base_url = listen_address(listen.args if listen is not None else ())
+
+            if base_url is not None:
+                endpoints.append(Endpoint(base_url + path, host, stub_status.file, stub_status.line))
+
+    return endpoints
@@ -0,0 +1,56 @@
+from collections import namedtuple
+from time import time
+
+ntp_port = 123
+
+# server is an (address, port) pair, offset and delay are in seconds, and error is None
+# when the server answered
+Sample = namedtuple('Sample', ['server', 'offset', 'delay', 'error'])
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+
+    if len(values) % 2:
+        return values[middle]
+
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def query_servers(servers, quorum, timeout=5.0):
+    from ntplib import NTPException, NTPPacket, NTPStats, system_to_ntp_time
+    from network import udp_exchange
+
+    samples = {}
+
+    def request(server):
+        return [NTPPacket(mode=3, version=3, tx_timestamp=system_to_ntp_time(time())).to_data()]
+
+    def on_reply(server, data):
+        dest_timestamp = system_to_ntp_time(time())
+
+        try:
+            stats = NTPStats()
+            stats.from_data(data)
+            stats.dest_timestamp = dest_timestamp
+        except NTPException:
+            samples[server] = Sample(server, None, None, 'invalid response')
+        else:
+            samples[server] = Sample(server, stats.offset, stats.delay, None)
+
+        return True
+
+    def answered():
+        return sum(1 for sample in samples.values() if sample.error is None)
+
+    # every server is asked at once, and the first quorum of answers is all that is waited for
+    errors = udp_exchange(servers, request, on_reply, timeout, lambda: answered() >= quorum, 256)
+
+    for server in servers:
+        if server in errors:
+            samples[server] = Sample(server, None, None, errors[server])
+        elif server not in samples:
+            samples[server] = Sample(server, None, None, 'not waited for' if answered() >= quorum else 'timed out')
+
+    return [samples[server] for server in servers]
@@ -0,0 +1,171 @@
+import os
+import errno
+import threading
+
+
+class NoSuchProcess(OSError):
+    def __init__(self, pid):
+        super(NoSuchProcess, self).__init__(errno.ESRCH, 'No such process', str(pid))
+
+
+class Process(object):
+    __slots__ = ('pid', 'ppid', 'uid', 'exe', 'cmdline', 'name')
+
+    def __init__(self, pid, ppid, uid, exe, cmdline, name):
+        self.pid = pid
+        self.ppid = ppid
+        self.uid = uid
+        self.exe = exe
+        self.cmdline = cmdline
+        self.name = name
+
+    def __repr__(self):
+        return '{0}({1})'.format(self.name, self.pid)
+
+
+def read_process(proc_path, pid):
+    pid_path = os.path.join(proc_path, str(pid))
+
+    # the owner of /proc/<pid> is the effective uid of the process
+    uid = os.stat(pid_path).st_uid
+
+    with open(os.path.join(pid_path, 'stat')) as f:
+        stat = f.read()
+
+    # the command name is in parentheses and can itself contain spaces and parentheses
+    comm = stat[stat.index('(') + 1:stat.rindex(')')]
+    ppid = int(stat[stat.rindex(')') + 2:].split()[1])
+
+    try:
+        with open(os.path.join(pid_path, 'cmdline')) as f:
+            cmdline = [arg for arg in f.read().split('\0') if arg]
+    except IOError:
+        cmdline = []
+
+    try:
+        exe = os.readlink(os.path.join(pid_path, 'exe'))
+    except OSError:
+        exe = None
+
+    name = comm
+
+    # the kernel truncates comm to 15 characters, the full name is in the cmdline
+    if len(comm) >= 15 and cmdline:
+        base_name = os.path.basename(cmdline[0].split(' ')[0])
+
+        if base_name.startswith(comm):
+            name = base_name
+
+    return Process(pid, ppid, uid, exe, cmdline, name)
+
+
+class ProcessSnapshot(object):
+    def __init__(self, processes=None, proc_path='/proc'):
+        self.proc_path = proc_path
+        self.processes = processes
+        self.entries = 0 if processes is None else len(processes)
+        self.child_pids = None
+        # processes looked up by pid before the snapshot was taken, None for those that cannot be read
+        self.single_processes = {}
+        self.lock = threading.Lock()
+
+    def take(self):
+        processes = {}
+
+        try:
+            entries = [entry for entry in os.listdir(self.proc_path) if entry.isdigit()]
+        except OSError:
+            entries = []
+
+        self.entries = len(entries)
+
+        for entry in entries:
+            try:
+                process = read_process(self.proc_path, int(entry))
+            except (IOError, OSError, ValueError):
+                # exited since the listing, or hidden from us
+                continue
+
+            processes[process.pid] = process
+
+        # swapped in whole, so that no check sees the table half read
+        self.child_pids = None
+        self.single_processes = {}
+        self.processes = processes
+
+        return self
+
+    def taken(self):
+        # the first check to need the whole table takes it, the others wait for it
+        if self.processes is None:
+            with self.lock:
+                if self.processes is None:
+                    self.take()
+
+    def single_process(self, pid):
+        if pid not in self.single_processes:
+            try:
+                self.single_processes[pid] = read_process(self.proc_path, pid)
+            except (IOError, OSError, ValueError):
+                self.single_processes[pid] = None
+
+        return self.single_processes[pid]
+
+    def process(self, pid):
+        pid = int(pid)
+
+        # a lookup by pid reads that process alone, rather than the whole of /proc
+        process = self.single_process(pid) if self.processes is None else self.processes.get(pid)
+
+        if process is None:
+            raise NoSuchProcess(pid)
+
+        return process
+
+    def visible(self, pid):
+        pid = int(pid)
+
+        if self.processes is None:
+            return self.single_process(pid) is not None
+
+        return pid in self.processes
+
+    def mount_options(self):
+        try:
+            with open(os.path.join(self.proc_path, 'mounts')) as f:
+                for line in f:
+                    fields = line.split()
+
+                    if len(fields) > 3 and fields[2] == 'proc' and fields[1] == self.proc_path:
+                        return fields[3].split(',')
+        except IOError:
+            pass
+
+        return []
+
+    def children(self, pid):
+        self.taken()
+
+        if self.child_pids is None:
+            self.child_pids = {}
+
+            for process in self.processes.itervalues():
+                self.child_pids.setdefault(process.ppid, []).append(process.pid)
+
+        return [self.processes[child_pid] for child_pid in sorted(self.child_pids.get(int(pid), []))]
+
+    def pids(self):
+        self.taken()
+
+        return sorted(self.processes)
+
+    def find(self, name):
+        self.taken()
+
+        # same matching as pidof(8): the process name, argv[0] or its basename
+        return [
+            pid for pid, process in sorted(self.processes.items())
+            if name == process.name or (
+                process.cmdline and name in (process.cmdline[0], os.path.basename(process.cmdline[0]))
+            )
+        ]
@@ -0,0 +1,63 @@
+import __builtin__
+import sys
+
+from time import time
+
+
+class ImportProfiler(object):
+    def __init__(self):
+        self.started = None
+        self.original_import = None
+        self.timings = {}
+        self.stack = []
+
+    def install(self):
+        if self.original_import is None:
+            self.started = time()
+            self.original_import = __builtin__.__import__
+            __builtin__.__import__ = self.timed_import
+
+    def uninstall(self):
+        if self.original_import is not None:
+            __builtin__.__import__ = self.original_import
+            self.original_import = None
+
+    def timed_import(self, name, globals=None, locals=None, fromlist=None, level=-1):
+        if name in sys.modules:
+            return self.original_import(name, globals, locals, fromlist, level)
+
+        self.stack.append(0.0)
+        started = time()
+
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time() - started
+            children = self.stack.pop()
+
+            if self.stack:
+                self.stack[-1] += elapsed
+
+            if not name:
+                name = '.' + ', .'.join(fromlist or ())
+
+            # a name can be imported more than once before it lands in sys.modules
+            # (i.e. implicit relative imports), so keep the slowest attempt
+            if elapsed > self.timings.get(name, (0, 0))[0]:
+                self.timings[name] = (elapsed, elapsed - children)
+
+    def report(self, limit=25):
+        lines = [
+            'startup import profile (top {0} of {1} imports, {2:.1f} ms since first import):'
+            .format(min(limit, len(self.timings)), len(self.timings), (time() - self.started) * 1000),
+            '  {0:>10}  {1:>10}  {2}'.format('cumulative', 'self', 'module')
+        ]
+        timings = sorted(self.timings.items(), key=lambda item: item[1][0], reverse=True)
+
+        for name, (cumulative, own) in timings[:limit]:
+            lines.append('  {0:>7.2f} ms  {1:>7.2f} ms  {2}'.format(cumulative * 1000, own * 1000, name))
+
+        return '\n'.join(lines)
+
+
+import_profiler = ImportProfiler()
@@ -0,0 +1,187 @@
+import random
+import socket
+import struct
+import threading
+
+from collections import namedtuple
+from time import time
+
+dns_port = 53
+rcodes = {1: 'FORMERR', 2: 'SERVFAIL', 3: 'NXDOMAIN', 4: 'NOTIMP', 5: 'REFUSED'}
+
+# nameserver is an (address, port) pair, latency is in seconds, and error is None
+# when the nameserver answered with addresses
+Answer = namedtuple('Answer', ['nameserver', 'addresses', 'latency', 'error'])
+
+
+def read_nameservers(resolv_conf_file):
+    nameservers = []
+
+    try:
+        with open(resolv_conf_file) as f:
+            for line in f:
+                fields = line.split()
+
+                if len(fields) > 1 and fields[0] == 'nameserver':
+                    nameservers.append((fields[1], dns_port))
+    except IOError:
+        pass
+
+    return nameservers
+
+
+def is_address(host):
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, host)
+
+            return True
+        except (socket.error, ValueError):
+            pass
+
+    return False
+
+
+def build_query(query_id, host, qtype=1):
+    # recursion desired, one question, A record in the IN class
+    header = struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0)
+    qname = ''.join(chr(len(label)) + label for label in host.rstrip('.').split('.')) + '\0'
+
+    return header + qname + struct.pack('!HH', qtype, 1)
+
+
+def skip_name(data, offset):
+    while True:
+        length = ord(data[offset])
+
+        # a compression pointer ends the name
+        if length & 0xc0 == 0xc0:
+            return offset + 2
+
+        offset += length + 1
+
+        if length == 0:
+            return offset
+
+
+def parse_response(data):
+    query_id, flags, qdcount, ancount = struct.unpack('!HHHH', data[:8])
+    rcode = flags & 0x0f
+    addresses = []
+    offset = 12
+
+    for i in range(qdcount):
+        offset = skip_name(data, offset) + 4
+
+    for i in range(ancount):
+        offset = skip_name(data, offset)
+        rtype, rclass, ttl, rdlength = struct.unpack('!HHIH', data[offset:offset + 10])
+        offset += 10
+
+        if rtype == 1 and rdlength == 4:
+            addresses.append(socket.inet_ntoa(data[offset:offset + 4]))
+
+        offset += rdlength
+
+    return query_id, rcode, addresses
+
+
+class Resolver(object):
+    def __init__(self, nameservers, timeout=2.0):
+        self.nameservers = nameservers
+        self.timeout = timeout
+        self.answers = {}
+        self.lock = threading.Lock()
+
+    def resolve(self, hosts):
+        # held while querying, a check asking for the same host waits for the
+        # lookup in flight instead of sending its own
+        with self.lock:
+            unresolved = [host for host in hosts if host not in self.answers]
+
+            if unresolved and self.nameservers:
+                self.answers.update(self.query(unresolved))
+
+            return dict((host, self.answers.get(host, [])) for host in hosts)
+
+    def answer(self, host):
+        if is_address(host) or not host:
+            return None
+
+        for answer in self.resolve([host])[host]:
+            if answer.addresses:
+                return answer
+
+        return None
+
+    def address(self, host):
+        if is_address(host):
+            return host
+
+        answer = self.answer(host)
+
+        return answer.addresses[0] if answer is not None else None
+
+    def query(self, hosts):
+        # network pulls in requests, which a run without DNS checks never needs
+        from network import udp_exchange
+
+        answers = dict((host, []) for host in hosts)
+        pending = {}
+
+        def queries(nameserver):
+            datagrams = []
+
+            for host in hosts:
+                query_id = random.randint(0, 0xffff)
+
+                while (nameserver, query_id) in pending:
+                    query_id = random.randint(0, 0xffff)
+
+                pending[(nameserver, query_id)] = (host, time())
+                datagrams.append(build_query(query_id, host))
+
+            return datagrams
+
+        def on_reply(nameserver, data):
+            try:
+                query_id, rcode, addresses = parse_response(data)
+            except (struct.error, IndexError, socket.error):
+                return False
+
+            if (nameserver, query_id) not in pending:
+                return False
+
+            host, sent = pending.pop((nameserver, query_id))
+
+            if rcode:
+                error = rcodes.get(rcode, 'rcode {0}'.format(rcode))
+            elif not addresses:
+                error = 'no A records'
+            else:
+                error = None
+
+            answers[host].append(Answer(nameserver, addresses, time() - sent, error))
+
+            # done with a nameserver once it answered everything it was asked
+            return not any(key[0] == nameserver for key in pending)
+
+        # every host is asked of every nameserver at once, a socket per nameserver
+        errors = udp_exchange(self.nameservers, queries, on_reply, self.timeout, lambda: not pending)
+
+        for nameserver, error in errors.items():
+            self.fail(answers, pending, nameserver, error)
+
+        for (nameserver, query_id), (host, sent) in pending.items():
+            answers[host].append(Answer(nameserver, [], None, 'timed out'))
+
+        for host in answers:
+            answers[host].sort(key=lambda answer: self.nameservers.index(answer.nameserver))
+
+        return answers
+
+    def fail(self, answers, pending, nameserver, error):
+        for key, (host, sent) in pending.items():
+            if key[0] == nameserver:
+                del pending[key]
+                answers[host].append(Answer(nameserver, [], None, error))
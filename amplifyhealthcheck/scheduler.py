@@ -0,0 +1,136 @@
+import threading
+
+from time import time
+
+IO_BOUND = 'io'
+CPU_BOUND = 'cpu'
+
+
+def io_bound(method):
+    method.check_kind = IO_BOUND
+
+    return method
+
+
+def cpu_bound(method):
+    method.check_kind = CPU_BOUND
+
+    return method
+
+
+class CheckScheduler(object):
+    def __init__(self, amphc, jobs=1, time_budget=None):
+        self.amphc = amphc
+        self.jobs = max(int(jobs), 1)
+        self.time_budget = time_budget or None
+
+    def check_kind(self, method):
+        return getattr(getattr(self.amphc, method), 'check_kind', IO_BOUND)
+
+    def run(self, methods):
+        checks = [(method, getattr(self.amphc, method)) for method in methods]
+
+        if self.time_budget is not None:
+            return self.run_within_budget(checks)
+
+        if self.jobs <= 1:
+            return [check() for method, check in checks]
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        executor = ThreadPoolExecutor(max_workers=self.jobs)
+        pending = {}
+
+        try:
+            # I/O-bound checks are queued on the pool first so that they are waiting
+            # on the network/disk while the CPU-bound ones hold the GIL in this thread
+            for method, check in checks:
+                if self.check_kind(method) == IO_BOUND:
+                    pending[method] = executor.submit(self.capture, check)
+
+            for method, check in checks:
+                if method not in pending:
+                    pending[method] = self.capture(check)
+
+            return [self.replay(pending[method]) for method, check in checks]
+        finally:
+            executor.shutdown(wait=True)
+
+    def run_within_budget(self, checks):
+        deadline = time() + self.time_budget
+        queued = list(reversed(checks))
+        outcomes = {}
+        finished = dict((method, threading.Event()) for method, check in checks)
+        lock = threading.Lock()
+
+        def work():
+            while not self.amphc.cancelled.is_set():
+                with lock:
+                    if not queued:
+                        return
+
+                    method, check = queued.pop()
+
+                outcomes[method] = self.capture(check)
+                finished[method].set()
+
+        # plain daemon threads rather than a pool: a check stuck past the budget is
+        # left behind, and must neither be waited for nor keep the process alive
+        for i in range(min(self.jobs, len(checks))):
+            thread = threading.Thread(target=work)
+            thread.daemon = True
+            thread.start()
+
+        results = []
+
+        for method, check in checks:
+            if finished[method].wait(max(deadline - time(), 0)):
+                results.append(self.replay(outcomes[method]))
+            else:
+                # checks polling the event stop early, the queued ones are not started
+                self.amphc.cancelled.set()
+                self.amphc.pretty_print('{0} did not finish within the {1:g}s time budget and was cancelled'
+                                        .format(method, self.time_budget), 'warn')
+                results.append(None)
+
+        return results
+
+    def map(self, check, items):
+        if self.jobs <= 1 or len(items) < 2:
+            return [check(item) for item in items]
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        executor = ThreadPoolExecutor(max_workers=min(self.jobs, len(items)))
+
+        try:
+            pending = [executor.submit(self.capture, lambda item=item: check(item)) for item in items]
+
+            # replayed into whatever the calling thread is capturing to
+            return [self.replay(outcome) for outcome in pending]
+        finally:
+            executor.shutdown(wait=True)
+
+    def capture(self, check):
+        self.amphc.capture.buffer = []
+
+        try:
+            return check(), self.amphc.capture.buffer, None
+        except Exception, exc:
+            return None, self.amphc.capture.buffer, exc
+        finally:
+            self.amphc.capture.buffer = None
+
+    def replay(self, outcome):
+        if hasattr(outcome, 'result'):
+            outcome = outcome.result()
+
+        result, messages, exc = outcome
+
+        for message in messages:
+            self.amphc.emit(message)
+
+        if exc is not None:
+            raise exc
+
+        return result
@@ -1,3 +1,5 @@
+import re
+
 from setuptools import setup
 
 classifiers = [
@@ -17,17 +19,18 @@ test_requirements = [
     'numpy',
 
     # Only their Exceptions
-    'setuptools',
-    'psutil',
     'requests'
 ]
 
 with open('README.rst', 'r') as f:
     long_description = f.read()
 
+with open('amplifyhealthcheck/__init__.py', 'r') as f:
+    version = re.search(r'__version__ = "(.+)"', f.read()).group(1)
+
 setup(
     name='nginx-amplify-agent-health-check',
-    version='0.1.6',
+    version=version,
     description='Static and Dynamic Analysis for nginx-amplify-agent Health Status',
     long_description=long_description,
     url='https://github.com/hiradyazdan/nginx-amplify-agent-health-check',
@@ -44,11 +47,12 @@ setup(
     classifiers=classifiers,
     keywords="nginx amplify nginx-amplify nginx-configuration health-check metrics",
     install_requires=[
-        'psutil',
-        'setuptools',
+        'packaging',
         'ntplib',
         'crossplane',
-        'requests'
+        'requests',
+        'futures',
+        'scandir'
     ],
     setup_requires=['pytest-runner'],
     tests_require=test_requirements,
@@ -0,0 +1,109 @@
+"""
+Parses a synthetic access log in the fixture's trace format, once a line at
+a time and once through LogParser's chunked pipeline, and reports lines/sec
+and bytes/sec for both.
+
+    python -m tests.benchmarks.log_parse_benchmark [megabytes ...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from amplifyhealthcheck.logformat import LogParser, log_formats, variable_pattern
+from amplifyhealthcheck.ngxconf import ConfigLoader, index_directives
+
+nginx_conf = 'tests/fixtures/nginx_files/etc/nginx/nginx.conf'
+
+
+def sample_values(i):
+    return {
+        'remote_addr': '10.%d.%d.%d' % (i % 7, i % 251, i % 13),
+        'remote_user': '-',
+        'time_local': '27/May/2018:12:%02d:%02d +0000' % (i // 60 % 60, i % 60),
+        'request': 'GET /api/v%d/items/%d?page=%d HTTP/1.1' % (i % 3, i, i % 17),
+        'status': random.choice(('200', '200', '200', '304', '404', '502')),
+        'body_bytes_sent': str(random.randint(0, 65536)),
+        'http_referer': 'https://example.com/page/%d' % (i % 101),
+        'http_user_agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/66.0',
+        'http_x_forwarded_for': '-',
+        'http_x_request_id': '%032x' % random.getrandbits(128),
+        'msec': '1527425939.%03d' % (i % 1000),
+        'server_name': 'vhost%d.example.com' % (i % 50),
+        'request_time': '0.%03d' % random.randint(0, 999),
+        'upstream_addr': '10.0.1.%d:8080' % (i % 8),
+        'upstream_status': '200',
+        'upstream_response_time': '0.%03d' % random.randint(0, 999),
+        'upstream_response_length': str(random.randint(0, 65536)),
+        'upstream_cache_status': random.choice(('HIT', 'MISS', '-')),
+    }
+
+
+def write_log(log_format, file_path, size):
+    # a block of distinct lines written over and over is enough to keep the regex honest
+    block = ''.join(
+        variable_pattern.sub(lambda match: sample_values(i).get(match.group(1) or match.group(2), '-'),
+                             log_format.format) + '\n'
+        for i in range(10000)
+    )
+
+    with open(file_path, 'wb') as f:
+        for i in range(max(size // len(block), 1)):
+            f.write(block)
+
+
+def per_line(log_format, file_path):
+    match = log_format.regex.match
+    lines = matched = 0
+
+    with open(file_path, 'rb') as f:
+        for line in f:
+            lines += 1
+            result = match(line)
+
+            if result is not None:
+                matched += 1
+                fields = dict(zip(log_format.fields, result.groups()))
+                fields['status'], fields['request_time']
+
+    return lines, matched
+
+
+def pipeline(log_format, file_path):
+    parser = LogParser(log_format)
+
+    for record in parser.parse_file(file_path):
+        record['status'], record['request_time']
+
+    return parser.lines, parser.matched
+
+
+def main(*sizes):
+    log_format = log_formats(index_directives(ConfigLoader().load(nginx_conf, use_cache=False)))['trace']
+
+    for megabytes in sizes or (1024,):
+        fd, file_path = tempfile.mkstemp(prefix='amphc-bench-', suffix='.log')
+        os.close(fd)
+
+        try:
+            write_log(log_format, file_path, megabytes << 20)
+            size = os.path.getsize(file_path)
+
+            print('trace format, %.0f MB' % (size / float(1 << 20)))
+
+            for name, parse in (('per line', per_line), ('pipeline', pipeline)):
+                started = time.time()
+                lines, matched = parse(log_format, file_path)
+                elapsed = time.time() - started
+
+                assert lines == matched
+
+                print('  %-9s %.2fs, %.0f lines/s, %.1f MB/s'
+                      % (name + ':', elapsed, lines / elapsed, size / elapsed / (1 << 20)))
+        finally:
+            os.remove(file_path)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
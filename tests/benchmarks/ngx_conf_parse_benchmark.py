@@ -0,0 +1,81 @@
+"""
+Compares parsing the include fan-out of an nginx config sequentially
+against parsing it on a process pool, with the parse cache turned off.
+
+    python -m tests.benchmarks.ngx_conf_parse_benchmark [jobs] [vhosts ...]
+"""
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+from amplifyhealthcheck.ngxconf import ConfigLoader
+
+vhost_template = '''
+server {
+    listen 80;
+    server_name vhost%(i)d.example.com www.vhost%(i)d.example.com;
+    root /var/www/vhost%(i)d;
+    access_log /var/log/nginx/vhost%(i)d.access.log main;
+    error_log /var/log/nginx/vhost%(i)d.error.log;
+
+    location / {
+        try_files $uri $uri/ /index.php?$args;
+    }
+
+    location ~ \\.php$ {
+        fastcgi_pass unix:/run/php/php-fpm.sock;
+        fastcgi_index index.php;
+        include fastcgi_params;
+    }
+
+    location ~* \\.(css|js|png|jpg|gif|ico)$ {
+        expires 30d;
+        add_header Cache-Control "public";
+    }
+}
+'''
+
+
+def build_conf_tree(conf_path, vhosts):
+    os.makedirs(os.path.join(conf_path, 'sites-enabled'))
+
+    with open(os.path.join(conf_path, 'fastcgi_params'), 'w') as f:
+        f.write('fastcgi_param QUERY_STRING $query_string;\nfastcgi_param REQUEST_METHOD $request_method;\n')
+
+    with open(os.path.join(conf_path, 'nginx.conf'), 'w') as f:
+        f.write('events {}\nhttp {\n    log_format main \'$remote_addr "$request" $status\';\n'
+                '    include %s/sites-enabled/*.conf;\n}\n' % conf_path)
+
+    for i in range(vhosts):
+        with open(os.path.join(conf_path, 'sites-enabled', 'vhost%05d.conf' % i), 'w') as f:
+            f.write(vhost_template % {'i': i})
+
+
+def main(jobs=None, *vhost_counts):
+    jobs = jobs or multiprocessing.cpu_count()
+
+    for vhosts in vhost_counts or (1000, 10000):
+        conf_path = tempfile.mkdtemp(prefix='amphc-bench-')
+        conf_file = os.path.join(conf_path, 'nginx.conf')
+
+        try:
+            build_conf_tree(conf_path, vhosts)
+
+            sequential = timeit.timeit(lambda: ConfigLoader().load(conf_file, use_cache=False), number=1)
+            parallel = timeit.timeit(lambda: ConfigLoader(jobs=jobs).load(conf_file, use_cache=False), number=1)
+
+            assert ConfigLoader().load(conf_file) == ConfigLoader(jobs=jobs).load(conf_file)
+
+            print('vhosts: %d, jobs: %d' % (vhosts, jobs))
+            print('  sequential: %.3fs' % sequential)
+            print('  parallel:   %.3fs' % parallel)
+            print('  speed-up:   %.1fx' % (sequential / parallel))
+        finally:
+            shutil.rmtree(conf_path)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,76 @@
+"""
+Compares the per-requirement distribution scan verify_py_pkgs used to do
+against the index it builds once per run.
+
+    python -m tests.benchmarks.py_pkgs_benchmark [distributions] [requirements]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+import pkg_resources
+
+from re import sub
+from amplifyhealthcheck.healthcheck import AmplifyAgentHealthCheck
+
+
+def build_agent_tree(agent_path, dists, reqs):
+    os.makedirs(os.path.join(agent_path, 'amplify'))
+
+    for i in range(dists):
+        dist_info = os.path.join(agent_path, 'amplify', 'vendored_pkg_%d-1.%d.0.dist-info' % (i, i))
+        os.makedirs(dist_info)
+
+        with open(os.path.join(dist_info, 'METADATA'), 'w') as f:
+            f.write('Metadata-Version: 2.1\nName: vendored-pkg-%d\nVersion: 1.%d.0\n' % (i, i))
+
+    with open(os.path.join(agent_path, 'requirements'), 'w') as f:
+        f.write('\n'.join('vendored-pkg-%d==1.%d.0' % (i, i) for i in range(0, dists, max(dists // reqs, 1))))
+
+
+def legacy_verify_py_pkgs(amphc):
+    rgx = '[^a-zA-Z0-9.]'
+
+    for pkg in filter(None, amphc.read_file('{}{}'.format(amphc.amp_agent_path, amphc.amp_reqs_file))):
+        required_pkg = sub(rgx, '', pkg)
+        installed_pkgs = list(pkg_resources.find_distributions('%s/amplify' % amphc.amp_agent_path))
+        installed_pkgs = [sub(rgx, '', str(package)) for package in installed_pkgs]
+
+        if required_pkg not in installed_pkgs:
+            pkg_resources.require(pkg)
+
+
+def indexed_verify_py_pkgs(amphc):
+    amphc.amp_py_dists = None
+
+    return amphc.verify_py_pkgs()
+
+
+def main(dists=500, reqs=50, repeat=3):
+    agent_path = tempfile.mkdtemp(prefix='amphc-bench-')
+
+    try:
+        build_agent_tree(agent_path, dists, reqs)
+
+        amphc = AmplifyAgentHealthCheck.__new__(AmplifyAgentHealthCheck)
+        super(AmplifyAgentHealthCheck, amphc).__init__()
+        amphc.verbose = False
+        amphc.amp_agent_path = agent_path
+        amphc.amp_reqs_file = '/requirements'
+
+        legacy = min(timeit.repeat(lambda: legacy_verify_py_pkgs(amphc), number=1, repeat=repeat))
+        assert indexed_verify_py_pkgs(amphc) == 0
+
+        indexed = min(timeit.repeat(lambda: indexed_verify_py_pkgs(amphc), number=1, repeat=repeat))
+
+        print('distributions: %d, requirements: %d' % (dists, len(amphc.read_file(agent_path + '/requirements'))))
+        print('per-requirement scan: %.4fs' % legacy)
+        print('index built once:     %.4fs' % indexed)
+        print('speed-up:             %.1fx' % (legacy / indexed))
+    finally:
+        shutil.rmtree(agent_path)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -1,9 +1,13 @@
 import mock
+import os
 import pytest
 import StringIO
+import subprocess
 import sys
 
+from amplifyhealthcheck import init
 from amplifyhealthcheck.cli import init_cli, cli_args
+from amplifyhealthcheck.profiling import import_profiler
 from unittest import TestCase
 
 xfail = pytest.mark.xfail
@@ -14,8 +18,8 @@ class ConsoleTestCase(TestCase):
     # @pytest.mark.focus
     @mock.patch('sys.exit')
     @mock.patch('atexit.register')
-    @mock.patch('amplifyhealthcheck.cli.AmplifyAgentHealthCheck.verify_method1', create=True, return_value=None)
-    @mock.patch('amplifyhealthcheck.cli.AmplifyAgentHealthCheck.verify_method2', create=True, return_value=None)
+    @mock.patch('amplifyhealthcheck.healthcheck.AmplifyAgentHealthCheck.verify_method1', create=True, return_value=None)
+    @mock.patch('amplifyhealthcheck.healthcheck.AmplifyAgentHealthCheck.verify_method2', create=True, return_value=None)
     @mock.patch('amplifyhealthcheck.cli.verification_methods')
     @mock.patch('amplifyhealthcheck.cli.cli_args')
     def test_init_cli(self, cli_args_mock, methods_mock, method2_mock, method1_mock, register_mock, exit_mock):
@@ -55,10 +59,9 @@ class ConsoleTestCase(TestCase):
 
     # @xfail
     # @pytest.mark.focus
-    @mock.patch('pkg_resources.require')
+    @mock.patch('amplifyhealthcheck.cli.__version__', '1.0.0')
     @mock.patch('sys.exit')
-    def test_cli_args(self, exit_mock, require_mock):
-        require_mock.return_value[0].version = '1.0.0'
+    def test_cli_args(self, exit_mock):
         exit_mock.return_value = mock.MagicMock()
 
         # get version
@@ -103,3 +106,96 @@ class ConsoleTestCase(TestCase):
             parser_args = cli_args()
 
         assert parser_args['methods'] == ['verify_method1', 'verify_method2']
+
+        # run checks concurrently
+        with mock.patch('sys.argv', ['amphc', '-j', '4']):
+            parser_args = cli_args()
+
+        assert parser_args['jobs'] == 4
+
+        # give up on checks still running after the time budget
+        with mock.patch('sys.argv', ['amphc', '--time-budget', '2.5']):
+            parser_args = cli_args()
+
+        assert parser_args['time_budget'] == 2.5
+
+        # parse nginx configuration without the cache
+        with mock.patch('sys.argv', ['amphc', '--no-cache']):
+            parser_args = cli_args()
+
+        self.assertFalse(parser_args['use_cache'])
+
+        # print import timings
+        with mock.patch('sys.argv', ['amphc', '--startup-profile']):
+            orig_output = sys.stderr
+            sys.stderr = StringIO.StringIO()
+
+            import_profiler.install()
+            import amplifyhealthcheck.metadata
+            parser_args = cli_args()
+
+            output = sys.stderr.getvalue().strip()
+            sys.stderr.close()
+            sys.stderr = orig_output
+
+        self.assertTrue(parser_args['startup_profile'])
+        assert output.startswith('startup import profile')
+        assert import_profiler.original_import is None
+
+    # @xfail
+    # @pytest.mark.focus
+    def test_lazy_imports(self):
+        script = (
+            "import sys; sys.argv = ['amphc', '--help']\n"
+            "from amplifyhealthcheck.cli import init_cli\n"
+            "try:\n"
+            "    init_cli()\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "sys.stderr.write(' '.join(m for m in ('requests', 'ntplib', 'crossplane', 'pkg_resources', 'distutils.spawn')"
+            " if m in sys.modules))\n"
+        )
+        process = subprocess.Popen([sys.executable, '-c', script], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, imported = process.communicate()
+
+        assert 'verify_agent_ps' in output
+        assert imported == ''
+
+    # @xfail
+    # @pytest.mark.focus
+    def test_single_check_is_light(self):
+        script = (
+            "import sys; sys.argv = ['amphc', '--plain', '-m', 'verify_agent_ps']\n"
+            "from amplifyhealthcheck.procfs import ProcessSnapshot\n"
+            "from amplifyhealthcheck.resolver import Resolver\n"
+            "ProcessSnapshot.take = lambda self: sys.stderr.write('/proc walked ')\n"
+            "Resolver.__init__ = lambda self, *args: sys.stderr.write('resolver built ')\n"
+            "from amplifyhealthcheck.cli import init_cli\n"
+            "init_cli()\n"
+            "sys.stderr.write('crossplane' if 'crossplane' in sys.modules else '')\n"
+        )
+        process = subprocess.Popen([sys.executable, '-c', script], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, loaded = process.communicate()
+
+        # neither the nginx config, the process table nor the resolver is loaded for a check that needs none of them
+        assert 'Amplify agent is' in output
+        assert loaded == ''
+
+    # @xfail
+    # @pytest.mark.focus
+    def test_init_baseline_config(self):
+        # a config.ini from before the newer options were added still starts the tool
+        cwd = os.getcwd()
+        os.chdir('tests/fixtures/config_files')
+
+        try:
+            amphc = init()
+        finally:
+            os.chdir(cwd)
+
+        assert amphc.ngx_conf_file == '/etc/nginx/nginx.conf'
+        assert amphc.cache_dir == '/var/cache/amphc'
+        assert amphc.time_budget == 0
+        assert amphc.sys_ntp_quorum == 2
+        assert amphc.sys_ntp_servers[0] == '0.pool.ntp.org'
+        assert amphc.ngx_log_volume_max_read_bytes == 8 << 20
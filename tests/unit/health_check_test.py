@@ -1,14 +1,23 @@
 import mock
+import os
+import re
 import pytest
+import shutil
+import tempfile
+import time
 
 from datetime import datetime, timedelta
 from amplifyhealthcheck.healthcheck import AmplifyAgentHealthCheck
+from amplifyhealthcheck.metadata import Distribution
+from amplifyhealthcheck.ngxbuild import Build
+from amplifyhealthcheck.ngxconf import ConfigLoader, index_directives
+from amplifyhealthcheck.ngxproc import discover_instances
+from amplifyhealthcheck.procfs import Process, ProcessSnapshot
 from unittest import TestCase
+from amplifyhealthcheck.resolver import Resolver
+from stubs import DNSStub, HTTPStub, NTPStub
 
 # Package Exceptions
-from pkg_resources import DistributionNotFound, VersionConflict
-from psutil import AccessDenied
-from ntplib import NTPException
 from socket import gaierror
 from requests.exceptions import ConnectionError
 
@@ -19,6 +28,11 @@ amplify_reqs_file = '/requirements'
 amplify_conf_file = 'tests/fixtures/agent_files/etc/amplify-agent/agent.conf'
 amplify_log_file = 'tests/fixtures/agent_files/var/log/amplify-agent/agent.log'
 amplify_pid_file = 'tests/fixtures/agent_files/var/run/amplify-agent/amplify-agent.pid'
+amplify_log_staleness_window = 600
+amplify_log_scan_max_bytes = 8 * 1024 * 1024
+amplify_log_scan_window = 3600
+amplify_receiver_url = 'https://receiver.amplify.nginx.com:443/ping'
+amplify_receiver_timeout = 10
 
 nginx_all_confs_path = 'tests/fixtures/nginx_files/etc/nginx'
 nginx_conf_file = 'tests/fixtures/nginx_files/etc/nginx/nginx.conf'
@@ -28,6 +42,7 @@ nginx_sites_available_conf_files = 'tests/fixtures/nginx_files/etc/nginx/sites-a
 nginx_sites_enabled_conf_files = 'tests/fixtures/nginx_files/etc/nginx/sites-enabled/*.conf'
 nginx_pid_file = 'tests/fixtures/nginx_files/var/run/nginx.pid'
 nginx_log_files = 'tests/fixtures/nginx_files/var/log/nginx/*.log'
+nginx_access_log_file = 'tests/fixtures/nginx_files/var/log/nginx/access.log'
 nginx_additional_metrics = [
     'sn="$server_name"',
     'rt=$request_time',
@@ -46,6 +61,28 @@ system_packages = [
     'gcc', 'musl-dev', 'linux-headers'
 ]
 system_find_package_command = ['apk', 'info']
+system_ntp_servers = ['0.pool.ntp.org', '1.pool.ntp.org']
+system_ntp_timeout = 5
+system_resolv_conf_file = 'tests/fixtures/system_files/etc/resolv.conf'
+nginx_version_output = (
+    'nginx version: nginx/1.25.3\n'
+    'built by gcc 12.2.0 (Debian 12.2.0-14)\n'
+    'configure arguments: --prefix=/etc/nginx --sbin-path=/usr/sbin/nginx --with-http_ssl_module'
+    ' --with-http_stub_status_module --with-http_v2_module --with-cc-opt=\'-g -O2\'\n'
+)
+
+
+def process_table():
+    return {
+        1: Process(1, 0, 0, '/sbin/init', ['/sbin/init'], 'init'),
+        100: Process(100, 1, 120, '/usr/bin/python', ['amplify-agent', '--config'], 'amplify-agent'),
+        120: Process(120, 1, 0, '/usr/sbin/nginx', ['nginx: master process /usr/sbin/nginx'], 'nginx'),
+        121: Process(121, 120, 120, None, ['nginx: worker process'], 'nginx')
+    }
+
+
+def distributions(pins):
+    return [Distribution(pin.split('==')[0], pin.split('==')[1], amplify_agent_path) for pin in pins]
 
 
 class HealthChckTestCase(TestCase):
@@ -55,6 +92,11 @@ class HealthChckTestCase(TestCase):
             verbose=True,
             decorate_mode=True,
             heading='Amplify Agent Health Check Analysis',
+            cache_dir=None,
+            use_cache=False,
+            jobs=1,
+            time_budget=None,
+            http_pool_size=10,
 
             # Amplify
             amplify_agent_path=amplify_agent_path,
@@ -62,73 +104,129 @@ class HealthChckTestCase(TestCase):
             amplify_conf_file=amplify_conf_file,
             amplify_log_file=amplify_log_file,
             amplify_pid_file=amplify_pid_file,
+            amplify_log_staleness_window=amplify_log_staleness_window,
+            amplify_log_scan_max_bytes=amplify_log_scan_max_bytes,
+            amplify_log_scan_window=amplify_log_scan_window,
+            amplify_receiver_url=amplify_receiver_url,
+            amplify_receiver_timeout=amplify_receiver_timeout,
 
             # Nginx
             nginx_all_confs_path=nginx_all_confs_path,
             nginx_conf_file=nginx_conf_file,
+            nginx_conf_parse_jobs=1,
             nginx_status_conf_file=nginx_status_conf_file,
+            nginx_stub_status_interval=0.2,
+            nginx_stub_status_timeout=1,
             nginx_sites_available_conf_files=nginx_sites_available_conf_files,
             nginx_sites_enabled_conf_files=nginx_sites_enabled_conf_files,
             nginx_mime_types_file=nginx_mime_types_file,
             nginx_log_files=nginx_log_files,
+            nginx_log_sample_lines=100,
+            nginx_log_sample_max_bytes=64 * 1024,
+            nginx_log_volume_window=0.3,
+            nginx_log_volume_max_lines_rate=5000,
+            nginx_log_volume_max_read_bytes=1 << 20,
             nginx_pid_file=nginx_pid_file,
             nginx_additional_metrics=nginx_additional_metrics,
 
             # System
             system_packages=system_packages,
             system_find_package_command=system_find_package_command,
-            system_time_diff_max_allowance=80
+            system_time_diff_max_allowance=80,
+            system_ntp_servers=system_ntp_servers,
+            system_ntp_quorum=2,
+            system_ntp_timeout=system_ntp_timeout,
+            system_resolv_conf_file=system_resolv_conf_file,
+            system_dns_timeout=0.5
         )
 
     @classmethod
     def teardown_class(cls):
         pass
 
-    @mock.patch('os.stat')
-    @mock.patch('psutil.Process')
+    @mock.patch('amplifyhealthcheck.procfs.ProcessSnapshot.take')
     @mock.patch('pwd.getpwuid')
-    @mock.patch('amplifyhealthcheck.healthcheck.AmplifyAgentHealthCheck.pid')
-    def setup_method(self, method, pid_method_mock, getpwuid_mock, process_mock, os_stat_mock):
-        os_stat_mock.return_value = mock.MagicMock(st_uid=120)
+    def setup_method(self, method, getpwuid_mock, take_mock):
         getpwuid_mock.return_value = mock.MagicMock(pw_name='permitted_user')  # nginx
-        pid_method_mock.return_value = mock.MagicMock()
-        process_mock.return_value.name.return_value = 'amplify-agent'
+        self.healthcheck.ps_snapshot = ProcessSnapshot(process_table())
+        self.clear_names()
 
         self.healthcheck.configure()
 
     def teardown_method(self, method):
+        self.clear_names()
         self.healthcheck.verbose = True
         self.healthcheck.ngx_all_confs_path = nginx_all_confs_path
         self.healthcheck.ngx_conf_file = nginx_conf_file
         self.healthcheck.ngx_log_files = nginx_log_files
-        self.healthcheck.ngx_conf_blocks = []
+        self.healthcheck.amp_log_file = amplify_log_file
+        self.healthcheck.amp_log_scan_max_bytes = amplify_log_scan_max_bytes
+        self.healthcheck.amp_log_scan_window = amplify_log_scan_window
+        self.healthcheck.sys_find_pkg_cmd = system_find_package_command
+        self.healthcheck.amp_py_dists = None
+        self.healthcheck.site_dists = None
+        self.healthcheck.ngx_directives = {}
+        self.healthcheck.jobs = 1
+        self.healthcheck.amp_receiver_url = amplify_receiver_url
+        self.healthcheck.amp_receiver_timeout = amplify_receiver_timeout
+        self.healthcheck.sys_ntp_servers = system_ntp_servers
+        self.healthcheck.sys_ntp_quorum = 2
+        self.healthcheck.sys_ntp_timeout = system_ntp_timeout
+        self.healthcheck.amp_conf_file = amplify_conf_file
+        self.healthcheck.ngx_log_volume_max_lines_rate = 5000
+        self.healthcheck.ngx_log_volume_max_read_bytes = 1 << 20
+        self.healthcheck.http = None
+
+    def clear_names(self):
+        self.healthcheck.user_names.clear()
+        self.healthcheck.group_names.clear()
 
     # @xfail
     # @pytest.mark.focus
     @mock.patch('subprocess.Popen')
-    def test_verify_sys_pkgs(self, popen_mock):
+    @mock.patch('amplifyhealthcheck.base.check_output')
+    def test_verify_sys_pkgs(self, check_output_mock, popen_mock):
+        check_output_mock.return_value = '\n'.join(system_packages + ['musl', 'busybox'])
+        fail_count = self.healthcheck.verify_sys_pkgs()
+
+        assert fail_count == 0
+        check_output_mock.assert_called_once_with(['apk', 'info'], stderr=mock.ANY)
+
+        check_output_mock.side_effect = OSError(Exception, 'No such file or directory')
+        fail_count = self.healthcheck.verify_sys_pkgs()
+
+        assert fail_count == 1
+
+        check_output_mock.side_effect = None
+        check_output_mock.return_value = '\n'.join(system_packages[2:])
+        fail_count = self.healthcheck.verify_sys_pkgs()
+
+        assert fail_count == 2
+
+        # package managers without a batched query fall back to one call per package
+        self.healthcheck.sys_find_pkg_cmd = ['pacman', '-Q']
         popen_mock.return_value.wait.return_value = 0
         fail_count = self.healthcheck.verify_sys_pkgs()
 
         assert fail_count == 0
+        assert popen_mock.call_count == len(system_packages)
 
         popen_mock.side_effect = OSError(Exception, 'No such file or directory')
         fail_count = self.healthcheck.verify_sys_pkgs()
 
-        assert fail_count > 0
+        assert fail_count == 1
 
         popen_mock.side_effect = None
         popen_mock.return_value.wait.return_value = 1
         fail_count = self.healthcheck.verify_sys_pkgs()
 
-        assert fail_count > 0
+        assert fail_count == len(system_packages)
 
     # @xfail
     # @pytest.mark.focus
-    @mock.patch('pkg_resources.find_distributions')
-    @mock.patch('pkg_resources.require')
-    def test_verify_py_pkgs(self, require_mock, find_dist_mock):
-        find_dist_mock.return_value = [
+    @mock.patch('amplifyhealthcheck.metadata.find_distributions')
+    def test_verify_py_pkgs(self, find_dist_mock):
+        find_dist_mock.return_value = distributions([
             'gevent==1.1.0',
             'lockfile==0.11.0',
             'netaddr==0.7.18',
@@ -143,12 +241,20 @@ class HealthChckTestCase(TestCase):
             'scandir==1.5',
             'crossplane==0.3.1',
             'PyMySQL==0.7.11'
-        ]
+        ])
+        fail_count = self.healthcheck.verify_py_pkgs()
+
+        assert fail_count == 0
+        assert find_dist_mock.call_count == 1
+
+        # the index is built once per run
         fail_count = self.healthcheck.verify_py_pkgs()
 
         assert fail_count == 0
+        assert find_dist_mock.call_count == 1
 
-        find_dist_mock.return_value = [
+        self.healthcheck.amp_py_dists = self.healthcheck.site_dists = None
+        find_dist_mock.return_value = distributions([
             'gevent==1.1.0',
             'lockfile==0.11.0',
             'netaddr==0.7.18',
@@ -156,20 +262,41 @@ class HealthChckTestCase(TestCase):
             'psutil==4.0.0',
             'requests==2.12.4',
             'ujson==1.33'
-        ]
-        require_mock.side_effect = DistributionNotFound(Exception, 'distribution not found')
+        ])
         fail_count = self.healthcheck.verify_py_pkgs()
 
-        assert fail_count > 0
+        assert fail_count == 7
+
+        # versions are compared by specifier, not by their sanitised names
+        self.healthcheck.amp_py_dists = self.healthcheck.site_dists = None
+        find_dist_mock.return_value = distributions([
+            'gevent==1.1.0',
+            'lockfile==0.11.0',
+            'netaddr==0.7.18',
+            'netifaces==0.10.4',
+            'psutil==4.0.0',
+            'requests==2.12.4',
+            'ujson==1.33.0',
+            'python_daemon==2.0.6',
+            'setproctitle==1.1.10',
+            'rstr==2.2.3',
+            'flup==1.0.2',
+            'scandir==1.5',
+            'crossplane==0.3.2',
+            'pymysql==0.7.11'
+        ])
+        fail_count = self.healthcheck.verify_py_pkgs()
+
+        assert fail_count == 1
 
     # @xfail
     # @pytest.mark.focus
-    @mock.patch('pkg_resources.find_distributions')
-    @mock.patch('subprocess.Popen')
+    @mock.patch('amplifyhealthcheck.metadata.find_distributions')
+    @mock.patch('amplifyhealthcheck.base.check_output')
     @mock.patch('amplifyhealthcheck.healthcheck.AmplifyAgentHealthCheck.check_file')
-    def test_verify_all_packages(self, check_file_mock, popen_mock, find_dist_mock):
+    def test_verify_all_packages(self, check_file_mock, check_output_mock, find_dist_mock):
         check_file_mock.return_value = True
-        find_dist_mock.return_value = [
+        find_dist_mock.return_value = distributions([
             'gevent==1.1.0',
             'lockfile==0.11.0',
             'netaddr==0.7.18',
@@ -184,8 +311,8 @@ class HealthChckTestCase(TestCase):
             'scandir==1.5',
             'crossplane==0.3.1',
             'PyMySQL==0.7.11'
-        ]
-        popen_mock.return_value.wait.return_value = 0
+        ])
+        check_output_mock.return_value = '\n'.join(system_packages)
         self.healthcheck.verbose = False
         fail_count = self.healthcheck.verify_all_packages()
 
@@ -212,25 +339,91 @@ class HealthChckTestCase(TestCase):
     # @xfail
     # @pytest.mark.focus
     @mock.patch('os.path.exists')
-    @mock.patch('amplifyhealthcheck.healthcheck.AmplifyAgentHealthCheck.read_file')
-    def test_verify_agent_log(self, read_file_mock, path_exists_mock):
+    @mock.patch('amplifyhealthcheck.healthcheck.time')
+    @mock.patch('amplifyhealthcheck.healthcheck.AmplifyAgentHealthCheck.tail_lines')
+    @mock.patch('amplifyhealthcheck.healthcheck.AmplifyAgentHealthCheck.os_stat')
+    def test_verify_agent_log(self, os_stat_mock, tail_lines_mock, time_mock, path_exists_mock):
         path_exists_mock.return_value = True
-        read_file_mock.return_value = ['line 1', 'line 2']
+        time_mock.return_value = 1527425939
+        os_stat_mock.return_value = mock.Mock(st_size=512 * 1024 * 1024, st_mtime=1527425939 - 30)
+        tail_lines_mock.return_value = iter(['2018-05-27 12:58:29,504 [123] supervisor agent started'])
         fail_count = self.healthcheck.verify_agent_log()
 
         assert fail_count == 0
+        assert 'agent started' in self.healthcheck.logs[-1]
 
         path_exists_mock.return_value = False
         fail_count = self.healthcheck.verify_agent_log()
 
         assert fail_count > 0
 
+        # not modified within the staleness window
         path_exists_mock.return_value = True
-        read_file_mock.return_value = []
+        os_stat_mock.return_value = mock.Mock(
+            st_size=1024, st_mtime=1527425939 - amplify_log_staleness_window - 1
+        )
+        fail_count = self.healthcheck.verify_agent_log()
+
+        assert fail_count > 0
+
+        # empty
+        os_stat_mock.return_value = mock.Mock(st_size=0, st_mtime=1527425939)
         fail_count = self.healthcheck.verify_agent_log()
 
         assert fail_count > 0
 
+    # @xfail
+    # @pytest.mark.focus
+    def test_verify_agent_log_errors(self):
+        log_file = tempfile.NamedTemporaryFile()
+        now = datetime.now()
+
+        def entry(minutes_ago, message):
+            return '{0},504 [1234] {1}\n'.format(
+                (now - timedelta(minutes=minutes_ago)).strftime('%Y-%m-%d %H:%M:%S'), message
+            )
+
+        log_file.write(
+            entry(120, 'bridge ERROR failed to connect to receiver.amplify.nginx.com') +
+            entry(30, 'supervisor agent started, version=1.4.1-1') +
+            entry(20, 'bridge ERROR failed to connect to receiver.amplify.nginx.com: timed out') +
+            'Traceback (most recent call last):\n  IOError: [Errno 13] Permission denied: \'/proc/1/io\'\n' +
+            entry(10, 'nginx_metrics CRITICAL unexpected error') +
+            entry(5, 'bridge sent 12 metrics, errors=0')
+        )
+        log_file.flush()
+
+        self.healthcheck.amp_log_file = log_file.name
+        counts, scanned_bytes = self.healthcheck.scan_agent_log()
+
+        # the entry logged two hours ago is outside the scan window
+        assert counts == {
+            'CRITICAL': 1,
+            'ERROR': 1,
+            'failed to connect to receiver': 1,
+            'permission denied on /proc': 1
+        }
+
+        fail_count = self.healthcheck.verify_agent_log_errors()
+
+        assert fail_count == 4
+
+        self.healthcheck.amp_log_scan_window = 0
+        counts, scanned_bytes = self.healthcheck.scan_agent_log()
+
+        assert counts['ERROR'] == 2
+        assert scanned_bytes == os.path.getsize(log_file.name)
+
+        self.healthcheck.amp_log_scan_max_bytes = len(entry(5, 'bridge sent 12 metrics, errors=0'))
+        fail_count = self.healthcheck.verify_agent_log_errors()
+
+        assert fail_count == 0
+
+        self.healthcheck.amp_log_file = '/path_does_not_exist'
+        fail_count = self.healthcheck.verify_agent_log_errors()
+
+        assert fail_count > 0
+
     # @xfail
     # @pytest.mark.focus
     def test_verify_agent_user(self):
@@ -253,12 +446,43 @@ class HealthChckTestCase(TestCase):
 
         assert fail_count > 0
 
+    # @xfail
+    # @pytest.mark.focus
+    @mock.patch('pwd.getpwuid')
+    def test_verify_ngx_instances(self, getpwuid_mock):
+        getpwuid_mock.return_value = mock.MagicMock(pw_name='permitted_user')
+        self.healthcheck.ngx_conf = dict(self.healthcheck.ngx_conf, errors=[])
+        fail_count = self.healthcheck.verify_ngx_instances()
+
+        assert fail_count == 0
+        assert self.healthcheck.ngx_instances.keys() == [120]
+
+        # a second instance with its own config and no workers left
+        processes = process_table()
+        processes[200] = Process(200, 1, 0, None, ['nginx: master process nginx -c /nonexistent/nginx.conf'], 'nginx')
+        self.healthcheck.ps_snapshot = ProcessSnapshot(processes)
+        self.healthcheck.jobs = 2
+        self.healthcheck.ngx_instances = discover_instances(self.healthcheck.ps_snapshot, nginx_conf_file)
+        fail_count = self.healthcheck.verify_ngx_instances()
+
+        assert fail_count == 2
+
+        getpwuid_mock.return_value = mock.MagicMock(pw_name='www-data')
+        self.clear_names()
+        fail_count = self.healthcheck.verify_ngx_instances()
+
+        assert fail_count == 3
+
+        self.healthcheck.ngx_instances = {}
+        fail_count = self.healthcheck.verify_ngx_instances()
+
+        assert fail_count == 1
+
     # @xfail
     # @pytest.mark.focus
     @mock.patch('os.path.isabs')
-    @mock.patch('psutil.Process')
-    def test_verify_ngx_master_ps(self, process_mock, is_abs_mock):
-        process_mock.return_value.ppid.return_value = 1
+    def test_verify_ngx_master_ps(self, is_abs_mock):
+        is_abs_mock.return_value = True
         fail_count = self.healthcheck.verify_ngx_master_ps()
 
         assert fail_count == 0
@@ -268,118 +492,146 @@ class HealthChckTestCase(TestCase):
 
         assert fail_count > 0
 
-        self.healthcheck.ngx_pid = '100'
-        process_mock.return_value.ppid.return_value = 87
+        self.healthcheck.ngx_pid = '121'
         fail_count = self.healthcheck.verify_ngx_master_ps()
 
         assert fail_count > 0
 
-        process_mock.return_value.ppid.return_value = 1
-        is_abs_mock.return_value = True
-        process_mock.return_value.exe.return_value = 'some_absolute_path'
+        self.healthcheck.ngx_pid = '120'
         fail_count = self.healthcheck.verify_ngx_master_ps()
 
         assert fail_count == 0
 
         is_abs_mock.return_value = False
-        process_mock.return_value.exe.return_value = 'some_relative_path'
         fail_count = self.healthcheck.verify_ngx_master_ps()
 
         assert fail_count > 0
 
     # @xfail
     # @pytest.mark.focus
-    @mock.patch('psutil.pids')
-    def test_verify_sys_ps_access(self, pids_mock):
-        pids_mock.return_value = [100, 120]
+    def test_verify_sys_ps_access(self):
         fail_count = self.healthcheck.verify_sys_ps_access()
 
         assert fail_count == 0
 
-        pids_mock.side_effect = AccessDenied(Exception, 'No Access')
+        # some /proc entries could not be read, i.e. hidepid=1
+        self.healthcheck.ps_snapshot.entries = 50000
+        fail_count = self.healthcheck.verify_sys_ps_access()
+
+        assert fail_count == 0
+        assert '4 of 50000 /proc entries readable' in self.healthcheck.logs[-1]
+
+        # nothing but our own processes are visible with hidepid=2
+        self.healthcheck.ps_snapshot.processes = {}
         fail_count = self.healthcheck.verify_sys_ps_access()
 
         assert fail_count > 0
 
     # @xfail
     # @pytest.mark.focus
-    @mock.patch('ntplib.NTPClient.request')
-    @mock.patch('amplifyhealthcheck.healthcheck.AmplifyAgentHealthCheck.datetime_now')
-    def test_verify_sys_time(self, datetime_now_mock, request_mock):
-        now_datetime = datetime(2018, 5, 27, 12, 58, 59, 504275)
-        now_timestamp = 1527425939.5042753
-
-        request_mock.return_value = mock.MagicMock(tx_time=now_timestamp)
-        datetime_now_mock.return_value = now_datetime + timedelta(
-            seconds=self.healthcheck.sys_time_diff_max_allowance
-        )
-        fail_count = self.healthcheck.verify_sys_time()
+    def test_verify_sys_time(self):
+        allowance = self.healthcheck.sys_time_diff_max_allowance
 
-        assert fail_count == 0
+        with NTPStub(offset=allowance - 10) as first, NTPStub(offset=allowance - 20) as second:
+            self.healthcheck.sys_ntp_servers = [first.server, second.server]
+            fail_count = self.healthcheck.verify_sys_time()
 
-        request_mock.return_value = mock.MagicMock(tx_time=now_timestamp)
-        datetime_now_mock.return_value = now_datetime + timedelta(
-            seconds=self.healthcheck.sys_time_diff_max_allowance + 1
-        )
-        fail_count = self.healthcheck.verify_sys_time()
+            assert fail_count == 0
+            assert 'median of 2 NTP servers' in self.healthcheck.logs[-2]
+            assert 'ms delay' in self.healthcheck.logs[-1]
 
-        assert fail_count > 0
+        # the median, so one server far off does not decide it
+        with NTPStub(offset=allowance + 100) as first, NTPStub(offset=1) as second, NTPStub(offset=2) as third:
+            self.healthcheck.sys_ntp_servers = [first.server, second.server, third.server]
+            self.healthcheck.sys_ntp_quorum = 3
+            fail_count = self.healthcheck.verify_sys_time()
 
-        request_mock.side_effect = NTPException(Exception, 'No response received from pool.ntp.org')
-        fail_count = self.healthcheck.verify_sys_time()
+            assert fail_count == 0
 
-        assert fail_count > 0
+        # behind by as much as ahead
+        with NTPStub(offset=-allowance - 1) as ntp_stub:
+            self.healthcheck.sys_ntp_servers = [ntp_stub.server]
+            fail_count = self.healthcheck.verify_sys_time()
+
+            assert fail_count > 0
+
+    # @xfail
+    # @pytest.mark.focus
+    def test_verify_sys_time_timeout(self):
+        # a dead server does not hold up the run once the others make the quorum
+        with NTPStub(respond=False) as dead, NTPStub(offset=30) as first, NTPStub(delay=0.1) as second:
+            self.healthcheck.sys_ntp_servers = [dead.server, first.server, second.server]
+            started = time.time()
+            fail_count = self.healthcheck.verify_sys_time()
+
+            assert fail_count == 0
+            assert time.time() - started < system_ntp_timeout / 2.0
+
+        # short of a quorum, the answers there are still count
+        with NTPStub(respond=False) as dead, NTPStub(offset=30) as alive:
+            self.healthcheck.sys_ntp_servers = [dead.server, alive.server]
+            self.healthcheck.sys_ntp_timeout = 0.2
+            fail_count = self.healthcheck.verify_sys_time()
+
+            assert fail_count == 0
+            assert 'Only 1 of 2 NTP servers answered' in [log for log in self.healthcheck.logs if 'Only' in log][-1]
+
+        # a server that does not answer costs the timeout and no more
+        with NTPStub(respond=False) as ntp_stub:
+            self.healthcheck.sys_ntp_servers = [ntp_stub.server]
+            started = time.time()
+            fail_count = self.healthcheck.verify_sys_time()
+
+            assert fail_count > 0
+            assert time.time() - started < 2.5
+
+        assert self.healthcheck.ntp_address('pool.ntp.org') == ('pool.ntp.org', 123)
+        assert self.healthcheck.ntp_address('127.0.0.1:1123') == ('127.0.0.1', 1123)
+        assert self.healthcheck.ntp_address('::1') == ('::1', 123)
 
     # @xfail
     # @pytest.mark.focus
     @mock.patch('os.path.exists')
-    @mock.patch('amplifyhealthcheck.healthcheck.Popen')
+    @mock.patch('amplifyhealthcheck.ngxbuild.Popen')
     def test_verify_ngx_stub_status(self, popen_mock, path_exists_mock):
         path_exists_mock.return_value = True
-        popen_mock.return_value.communicate.return_value = (
-            'http_dav_module\nhttp_ssl_module\nhttp_stub_status_module\nhttp_gzip_static_module\nhttp_v2_module',
-            ''
-        )
+        popen_mock.return_value.communicate.return_value = ('', nginx_version_output)
 
         fail_count = self.healthcheck.verify_ngx_stub_status()
 
         assert fail_count == 0
+        # the binary of the running master
+        assert popen_mock.call_args[0][0] == ['/usr/sbin/nginx', '-V']
 
         self.healthcheck.verbose = False
-        path_exists_mock.return_value = True
-        popen_mock.return_value.communicate.return_value = (
-            'http_dav_module\nhttp_ssl_module\nhttp_stub_status_module\nhttp_gzip_static_module\nhttp_v2_module',
-            ''
-        )
-
         fail_count = self.healthcheck.verify_ngx_stub_status()
 
         assert fail_count == 0
+        # inspected once, and reused by every check after that
+        assert popen_mock.call_count == 1
 
         path_exists_mock.return_value = False
-        popen_mock.return_value.communicate.return_value = (
-            'http_dav_module\nhttp_ssl_module\nhttp_stub_status_module\nhttp_gzip_static_module\nhttp_v2_module',
-            ''
-        )
         fail_count = self.healthcheck.verify_ngx_stub_status()
 
         assert fail_count > 0
 
         path_exists_mock.return_value = True
-
+        self.healthcheck.ngx_build = None
         popen_mock.return_value.communicate.return_value = (
-            'http_dav_module\nhttp_ssl_module\nhttp_gzip_static_module\nhttp_v2_module',
-            'error'
+            '', nginx_version_output.replace(' --with-http_stub_status_module', '')
         )
         fail_count = self.healthcheck.verify_ngx_stub_status()
 
         assert fail_count > 0
 
-        path_exists_mock.return_value = True
-        popen_mock.return_value.communicate.return_value = (
-            'http_dav_module\nhttp_ssl_module\nhttp_stub_status_module\nhttp_gzip_static_module\nhttp_v2_module',
-            ''
-        )
+        self.healthcheck.ngx_build = None
+        popen_mock.side_effect = OSError(2, 'No such file or directory')
+        fail_count = self.healthcheck.verify_ngx_stub_status()
+
+        assert fail_count > 0
+
+        popen_mock.side_effect = None
+        popen_mock.return_value.communicate.return_value = ('', nginx_version_output)
         self.teardown_method(None)
         self.healthcheck.ngx_conf_file = 'tests/fixtures/nginx_files/etc/nginx/nginx.conf.missing'
         self.setup_method(None)
@@ -389,9 +641,233 @@ class HealthChckTestCase(TestCase):
 
     # @xfail
     # @pytest.mark.focus
+    def test_ngx_included(self):
+        conf_dir = tempfile.mkdtemp()
+
+        try:
+            os.makedirs(os.path.join(conf_dir, 'conf.d/disabled'))
+
+            files = {
+                'nginx.conf': 'events {}\nhttp { include conf.d/*.conf; }\n',
+                'conf.d/stub_status.conf': 'server { listen 8080; }\n',
+                'conf.d/disabled/old_status.conf': 'server { listen 8081; }\n',
+            }
+
+            for file_name, content in files.items():
+                with open(os.path.join(conf_dir, file_name), 'w') as f:
+                    f.write(content)
+
+            self.healthcheck.ngx_conf = ConfigLoader().load(os.path.join(conf_dir, 'nginx.conf'), use_cache=False)
+
+            assert self.healthcheck.ngx_included(os.path.join(conf_dir, 'conf.d/stub_status.conf'))
+            # nginx does not match the glob across directories
+            assert not self.healthcheck.ngx_included(os.path.join(conf_dir, 'conf.d/disabled/old_status.conf'))
+        finally:
+            shutil.rmtree(conf_dir)
+
+    # @xfail
+    # @pytest.mark.focus
+    def test_verify_ngx_stub_status_metrics(self):
+        fail_count = self.healthcheck.verify_ngx_stub_status_metrics()
+
+        # the fixture nginx.conf has no stub_status location
+        assert fail_count == 1
+
+        def stub_status(dropped=0, active=3):
+            # 50 more requests between each scrape, the scrape included
+            scrapes = len(http_stub.requests)
+
+            return (
+                'Active connections: {0} \nserver accepts handled requests\n {1} {2} {3} \n'
+                'Reading: 0 Writing: 1 Waiting: 2 \n'.format(active, 1000 + scrapes, 1000 + scrapes - dropped,
+                                                               5000 + scrapes * 50)
+            )
+
+        with HTTPStub(body=stub_status) as http_stub:
+            self.load_ngx_conf(
+                'http {{ server {{ listen 127.0.0.1:{0}; location /nginx_status {{ stub_status; }} }} }}'
+                .format(http_stub.server.server_address[1])
+            )
+            fail_count = self.healthcheck.verify_ngx_stub_status_metrics()
+
+            assert fail_count == 0
+            assert http_stub.requests == ['/nginx_status', '/nginx_status']
+            # both scrapes over one keep-alive connection
+            assert http_stub.connections == 1
+            # 49 requests of others within the 0.2s between the scrapes
+            assert 150 < float(re.search(r'([\d.]+) requests/s', self.healthcheck.logs[-1]).group(1)) <= 245
+            assert '3 active connections (reading 0, writing 1, waiting 2), 0.00% of accepted' in self.healthcheck.logs[-1]
+
+            http_stub.body = lambda: stub_status(dropped=10)
+            fail_count = self.healthcheck.verify_ngx_stub_status_metrics()
+
+            assert fail_count == 0
+            assert 'NGINX dropped 10 of 1004 accepted connections' in self.healthcheck.logs[-1]
+
+            # more requests being read and written than connections, as with HTTP/2 streams
+            http_stub.body = lambda: stub_status(active=1)
+            fail_count = self.healthcheck.verify_ngx_stub_status_metrics()
+
+            assert fail_count == 0
+
+            http_stub.body = lambda: stub_status(active=0)
+            fail_count = self.healthcheck.verify_ngx_stub_status_metrics()
+
+            assert fail_count == 1
+            assert 'reports no active connections' in self.healthcheck.logs[-1]
+
+            http_stub.body = 'Hello world!'
+            fail_count = self.healthcheck.verify_ngx_stub_status_metrics()
+
+            assert fail_count == 1
+            assert 'does NOT answer with stub_status output' in self.healthcheck.logs[-2]
+
+            http_stub.status = 403
+            fail_count = self.healthcheck.verify_ngx_stub_status_metrics()
+
+            assert fail_count == 1
+            assert '403' in self.healthcheck.logs[-2]
+
+    # @xfail
+    # @pytest.mark.focus
+    @mock.patch('amplifyhealthcheck.ngxbuild.Popen')
+    def test_verify_ngx_access_log_samples(self, popen_mock):
+        # without the build, the fixture's relative access_log path is resolved against the directory of nginx.conf
+        popen_mock.side_effect = OSError(2, 'No such file or directory')
+        fail_count = self.healthcheck.verify_ngx_access_log_samples()
+
+        assert fail_count == 0
+        assert 'access log {0} CANNOT be sampled'.format(
+            os.path.join(os.path.dirname(nginx_conf_file), nginx_access_log_file)
+        ) in self.healthcheck.logs[-1]
+
+        # and against the --prefix nginx was built with otherwise
+        self.healthcheck.ngx_build = Build('1.21.6', ('--prefix={0}'.format(os.getcwd()),), frozenset())
+        fail_count = self.healthcheck.verify_ngx_access_log_samples()
+
+        assert fail_count == 0
+        assert 'access log {0} is empty'.format(os.path.join(os.getcwd(), nginx_access_log_file)) in \
+            self.healthcheck.logs[-1]
+
+        empty_log = tempfile.NamedTemporaryFile(suffix='.log')
+        self.load_ngx_conf('http {{ access_log {0}; }}'.format(empty_log.name))
+        fail_count = self.healthcheck.verify_ngx_access_log_samples()
+
+        assert fail_count == 0
+        assert 'is empty' in self.healthcheck.logs[-1]
+
+        log_line = '10.0.0.{0} "GET / HTTP/1.1" 200 rt=0.01{0} ua="{1}"\n'
+        access_log = tempfile.NamedTemporaryFile(suffix='.log')
+        # far more than is sampled, the oldest lines would not match
+        access_log.write('garbage\n' * 5000)
+        access_log.write(''.join(log_line.format(i % 10, '-' if i % 4 else '10.0.1.1:80') for i in range(5000)))
+        access_log.write('truncated line\n')
+        access_log.flush()
+
+        self.load_ngx_conf(
+            'http {{ log_format main \'$remote_addr "$request" $status \' \'rt=$request_time ua="$upstream_addr"\';'
+            ' access_log {0} main; server {{ access_log {0} main; access_log /var/log/nginx/other.log json; }} }}'
+            .format(access_log.name)
+        )
+        fail_count = self.healthcheck.verify_ngx_access_log_samples()
+
+        assert fail_count == 1
+        assert 'uses log_format json, which is NOT defined' in self.healthcheck.logs[-1]
+        assert '99 of 100 sampled lines of NGINX access log {0} match log_format main (99.0%)'.format(
+            access_log.name
+        ) in self.healthcheck.logs[-3]
+        assert 'upstream_addr 76%' in self.healthcheck.logs[-2]
+
+        self.load_ngx_conf('http {{ access_log {0}; }}'.format(access_log.name))
+        fail_count = self.healthcheck.verify_ngx_access_log_samples()
+
+        assert fail_count == 1
+        assert 'NONE of the 100 sampled lines' in self.healthcheck.logs[-1]
+
+    # @xfail
+    # @pytest.mark.focus
+    def test_verify_ngx_log_volume(self):
+        log_path = tempfile.mkdtemp()
+        log_files = [os.path.join(log_path, '{0}.log'.format(name)) for name in ('access', 'api', 'error')]
+
+        for log_file in log_files:
+            open(log_file, 'w').close()
+
+        self.healthcheck.ngx_log_files = os.path.join(log_path, '*.log')
+        self.healthcheck.verbose = True
+
+        def write_logs(window):
+            # what nginx writes while the window is open, 200 and 2000 lines
+            with open(log_files[0], 'a') as f:
+                f.write(('x' * 99 + '\n') * 200)
+
+            with open(log_files[1], 'a') as f:
+                f.write(('y' * 49 + '\n') * 2000)
+
+        def verify_ngx_log_volume():
+            # a window of exactly two seconds
+            with mock.patch.object(self.healthcheck.cancelled, 'wait', side_effect=write_logs) as wait_mock, \
+                    mock.patch('amplifyhealthcheck.healthcheck.time', side_effect=[100.0, 102.0]):
+                fail_count = self.healthcheck.verify_ngx_log_volume()
+
+            # a single window for the three files
+            wait_mock.assert_called_once_with(self.healthcheck.ngx_log_volume_window)
+
+            return fail_count
+
+        try:
+            fail_count = verify_ngx_log_volume()
+            logs = self.healthcheck.logs[-4:]
+
+            assert fail_count == 0
+            assert 'access.log file grows by 100.0 lines/s, 9.8 KB/s' in logs[0]
+            assert 'api.log file grows by 1000.0 lines/s, 48.8 KB/s' in logs[1]
+            assert 'error.log file grows by 0.0 lines/s, 0.0 KB/s' in logs[2]
+            assert 'NGINX logs grow by 1100.0 lines/s, 58.6 KB/s in total over 2.0s' in logs[3]
+
+            # over the ceiling, the file that is and the total are both warned about
+            self.healthcheck.ngx_log_volume_max_lines_rate = 500
+            fail_count = verify_ngx_log_volume()
+            logs = self.healthcheck.logs[-4:]
+
+            assert fail_count == 0
+            assert 'access.log file grows by 100.0 lines/s' in logs[0]
+            assert not logs[0].startswith('\33[33m')
+            assert 'api.log file grows by 1000.0 lines/s, more than the 500 lines/s the agent' in logs[1]
+            assert logs[1].startswith('\33[33m')
+            assert 'NGINX logs grow by 1100 lines/s in total, more than the 500 lines/s the agent' in logs[3]
+
+            # bursts bigger than what is read are estimated from the part that was
+            self.healthcheck.ngx_log_volume_max_lines_rate = 5000
+            self.healthcheck.ngx_log_volume_max_read_bytes = 1000
+            fail_count = verify_ngx_log_volume()
+            logs = self.healthcheck.logs[-4:]
+
+            assert fail_count == 0
+            assert 'access.log file grows by 100.0 lines/s' in logs[0]
+            assert 'api.log file grows by 1000.0 lines/s' in logs[1]
+        finally:
+            shutil.rmtree(log_path)
+
+        self.healthcheck.ngx_log_files = os.path.join(log_path, '*.log')
+        fail_count = self.healthcheck.verify_ngx_log_volume()
+
+        assert fail_count == 1
+
+    def load_ngx_conf(self, conf):
+        conf_file = tempfile.NamedTemporaryFile(suffix='.conf')
+        conf_file.write(conf)
+        conf_file.flush()
+
+        self.healthcheck.ngx_directives = index_directives(ConfigLoader().load(conf_file.name, use_cache=False))
+
+    # @xfail
+    # @pytest.mark.focus
+    @mock.patch('grp.getgrgid')
     @mock.patch('pwd.getpwuid')
-    def test_verify_ngx_logs_read_access(self, getpwuid_mock):
+    def test_verify_ngx_logs_read_access(self, getpwuid_mock, getgrgid_mock):
         getpwuid_mock.return_value = mock.MagicMock(pw_name='permitted_user')  # nginx
+        getgrgid_mock.return_value = mock.MagicMock(gr_name='permitted_user')
         fail_count = self.healthcheck.verify_ngx_logs_read_access()
 
         assert fail_count == 0
@@ -403,6 +879,7 @@ class HealthChckTestCase(TestCase):
         assert fail_count == 0
 
         getpwuid_mock.return_value = mock.MagicMock(pw_name='not_permitted_user')
+        self.clear_names()
         fail_count = self.healthcheck.verify_ngx_logs_read_access()
 
         assert fail_count > 0
@@ -416,13 +893,17 @@ class HealthChckTestCase(TestCase):
 
     # @xfail
     # @pytest.mark.focus
+    @mock.patch('grp.getgrgid')
     @mock.patch('pwd.getpwuid')
     @mock.patch('os.stat')
-    def test_verify_ngx_config_files_access(self, os_stat_mock, getpwuid_mock):
+    def test_verify_ngx_config_files_access(self, os_stat_mock, getpwuid_mock, getgrgid_mock):
         getpwuid_mock.return_value = mock.MagicMock(pw_name='permitted_user')  # nginx
+        getgrgid_mock.return_value = mock.MagicMock(gr_name='permitted_user')
         fail_count = self.healthcheck.verify_ngx_config_files_access()
 
         assert fail_count == 0
+        # the includes of the fixture nginx.conf are loaded, only the spare copy is left over
+        assert self.unused_ngx_conf_files() == [os.path.join(nginx_all_confs_path, 'nginx.conf.missing')]
 
         self.healthcheck.verbose = False
         getpwuid_mock.return_value = mock.MagicMock(pw_name='permitted_user')  # nginx
@@ -431,18 +912,98 @@ class HealthChckTestCase(TestCase):
         assert fail_count == 0
 
         getpwuid_mock.return_value = mock.MagicMock(pw_name='not_permitted_user')
+        getgrgid_mock.return_value = mock.MagicMock(gr_name='not_permitted_user')
         os_stat_mock.return_value = mock.MagicMock(st_mode=0)
+        self.clear_names()
         fail_count = self.healthcheck.verify_ngx_config_files_access()
 
         assert fail_count > 0
 
+        # only the files the parsed config loaded are checked
         self.teardown_method(None)
         self.healthcheck.ngx_all_confs_path = '/path_does_not_exist'
         self.setup_method(None)
+        getpwuid_mock.return_value = mock.MagicMock(pw_name='permitted_user')  # nginx
+        fail_count = self.healthcheck.verify_ngx_config_files_access()
+
+        assert fail_count == 0
+
+        # without a parsed config the directory is walked instead
+        self.healthcheck.ngx_conf = None
         fail_count = self.healthcheck.verify_ngx_config_files_access()
 
         assert fail_count > 0
 
+        # and a directory in it that cannot be listed is reported, not skipped
+        self.teardown_method(None)
+        self.setup_method(None)
+        self.healthcheck.ngx_conf = None
+        unreadable = OSError(13, 'Permission denied')
+
+        with mock.patch('amplifyhealthcheck.base.scandir', side_effect=unreadable):
+            fail_count = self.healthcheck.verify_ngx_config_files_access()
+
+        assert fail_count == 2
+        assert 'NGINX {0} cannot be accessed: Permission denied'.format(nginx_all_confs_path) in \
+            self.healthcheck.logs[-2]
+
+    def unused_ngx_conf_files(self):
+        unused_files = []
+
+        for log in self.healthcheck.logs:
+            match = re.search(r'NGINX (\S+) file is not part of the loaded configuration', log)
+
+            if match is not None:
+                unused_files.append(match.group(1))
+
+        del self.healthcheck.logs[:]
+
+        return unused_files
+
+    # @xfail
+    # @pytest.mark.focus
+    @mock.patch('grp.getgrgid')
+    @mock.patch('pwd.getpwuid')
+    def test_verify_ngx_config_files_access_symlinks(self, getpwuid_mock, getgrgid_mock):
+        getpwuid_mock.return_value = mock.MagicMock(pw_name='permitted_user')  # nginx
+        getgrgid_mock.return_value = mock.MagicMock(gr_name='permitted_user')
+        conf_dir = tempfile.mkdtemp()
+        outside_dir = tempfile.mkdtemp()
+
+        try:
+            for sub_dir in ('sites-available', 'sites-enabled'):
+                os.makedirs(os.path.join(conf_dir, sub_dir))
+
+            files = {
+                'nginx.conf': 'events {{}}\nhttp {{\n    include sites-enabled/*.conf;\n    include {0}/*.conf;\n}}\n'
+                              .format(outside_dir),
+                'sites-available/app.conf': 'server { listen 8080; }\n',
+                'sites-available/old.conf': 'server { listen 8081; }\n',
+            }
+
+            for file_name, content in files.items():
+                with open(os.path.join(conf_dir, file_name), 'w') as f:
+                    f.write(content)
+
+            with open(os.path.join(outside_dir, 'upstreams.conf'), 'w') as f:
+                f.write('upstream backend { server 127.0.0.1:9000; }\n')
+
+            # the usual debian layout, enabled sites are symlinks to the available ones
+            os.symlink('../sites-available/app.conf', os.path.join(conf_dir, 'sites-enabled/app.conf'))
+
+            self.healthcheck.ngx_all_confs_path = conf_dir
+            self.healthcheck.ngx_conf = ConfigLoader().load(os.path.join(conf_dir, 'nginx.conf'), use_cache=False)
+            del self.healthcheck.logs[:]
+            fail_count = self.healthcheck.verify_ngx_config_files_access()
+
+            assert fail_count == 0
+            # the include outside the config directory is checked, and neither side of the symlink is unused
+            assert 'NGINX upstreams.conf file is readable' in ''.join(self.healthcheck.logs)
+            assert self.unused_ngx_conf_files() == [os.path.join(conf_dir, 'sites-available/old.conf')]
+        finally:
+            shutil.rmtree(conf_dir)
+            shutil.rmtree(outside_dir)
+
     # @xfail
     # @pytest.mark.focus
     def test_verify_ngx_metrics(self):
@@ -471,15 +1032,123 @@ class HealthChckTestCase(TestCase):
 
         assert fail_count == 2
 
-    @xfail
+    # @xfail
     # @pytest.mark.focus
     def test_verify_dns_resolver(self):
-        pass
+        fail_count = self.healthcheck.verify_dns_resolver()
+
+        # the fixture resolv.conf has no nameservers
+        assert fail_count > 0
+
+        agent_conf = tempfile.NamedTemporaryFile()
+        agent_conf.write('[cloud]\napi_url = https://api.amplify.test:443/1.4\napi_timeout = 10.0\n')
+        agent_conf.flush()
+        self.healthcheck.amp_conf_file = agent_conf.name
+        self.healthcheck.amp_receiver_url = 'https://receiver.amplify.test/ping'
+
+        assert self.healthcheck.receiver_hosts() == ['receiver.amplify.test', 'api.amplify.test']
+
+        records = {'receiver.amplify.test': ['10.0.0.1'], 'api.amplify.test': ['10.0.0.2']}
+
+        stubs = []
+
+        # nothing is answered before both hosts were asked of both nameservers, so a resolver
+        # waiting on one answer before sending the next query times out
+        def all_asked():
+            return sum(len(stub.received) for stub in stubs) == 4
+
+        with DNSStub(records, release=all_asked) as first, DNSStub(records, release=all_asked) as second:
+            stubs.extend([first, second])
+            self.healthcheck.resolver = Resolver([first.address, second.address], timeout=5)
+            fail_count = self.healthcheck.verify_dns_resolver()
+
+            assert fail_count == 0
+            assert len(first.received) == len(second.received) == 2
+            assert 'receiver.amplify.test resolves to 10.0.0.1 (127.0.0.1:' in self.healthcheck.logs[-2]
+
+            # memoised for the rest of the run
+            fail_count = self.healthcheck.verify_dns_resolver()
+
+            assert fail_count == 0
+            assert len(first.received) == 2
+
+        with DNSStub({'receiver.amplify.test': ['10.0.0.1']}) as first, DNSStub({}, respond=False) as second:
+            self.healthcheck.resolver = Resolver([first.address, second.address], timeout=0.2)
+            fail_count = self.healthcheck.verify_dns_resolver()
+
+            assert fail_count == 1
+            assert [log for log in self.healthcheck.logs if 'receiver.amplify.test' in log][-1].startswith('\33[33m')
+            assert 'NXDOMAIN' in [log for log in self.healthcheck.logs if 'api.amplify.test' in log][-1]
+
+    # @xfail
+    # @pytest.mark.focus
+    def test_verify_outbound_tls_access_resolved(self):
+        with DNSStub({'receiver.amplify.test': ['127.0.0.1']}) as dns_stub, HTTPStub(body='pong') as http_stub:
+            self.healthcheck.resolver = Resolver([dns_stub.address], timeout=0.5)
+            self.healthcheck.amp_receiver_url = http_stub.url.replace('127.0.0.1', 'receiver.amplify.test') + '/ping'
+
+            assert self.healthcheck.verify_dns_resolver() == 0
+
+            # connects to the address the resolver check found, without a second lookup
+            fail_count = self.healthcheck.verify_outbound_tls_access()
+
+            assert fail_count == 0
+            assert http_stub.requests == ['/ping']
+            assert len(dns_stub.received) == 1
+
+    # @xfail
+    # @pytest.mark.focus
+    def test_verify_outbound_tls_access_pooled(self):
+        cert_file = 'tests/fixtures/certs/receiver.crt'
+        dns_stub = DNSStub({'receiver.amplify.test': ['127.0.0.1']})
+        http_stub = HTTPStub(body='pong', cert_file=cert_file, key_file='tests/fixtures/certs/receiver.key')
+
+        with dns_stub, http_stub:
+            receiver_url = http_stub.url.replace('127.0.0.1', 'receiver.amplify.test')
+            agent_conf = tempfile.NamedTemporaryFile()
+            agent_conf.write('[cloud]\napi_url = {0}/1.4\n'.format(receiver_url))
+            agent_conf.flush()
+
+            self.healthcheck.amp_conf_file = agent_conf.name
+            self.healthcheck.amp_receiver_url = receiver_url + '/ping'
+            self.healthcheck.resolver = Resolver([dns_stub.address], timeout=0.5)
+            self.healthcheck.http_session().trust_env = False
+            self.healthcheck.http_session().verify = cert_file
+
+            fail_count = self.healthcheck.verify_outbound_tls_access()
+            logs = self.healthcheck.logs[-2:]
+
+            # the receiver and the API share one connection
+            assert fail_count == 0
+            assert http_stub.requests == ['/ping', '/1.4']
+            assert http_stub.connections == 1
+            assert 'dns ' in logs[0] and 'connect ' in logs[0] and 'tls ' in logs[0] and 'first byte ' in logs[0]
+            assert 'connection reused' in logs[1]
+
+    # @xfail
+    # @pytest.mark.focus
+    def test_verify_outbound_tls_access_timeout(self):
+        with HTTPStub(body='pong') as http_stub:
+            self.healthcheck.amp_receiver_url = http_stub.url + '/ping'
+            fail_count = self.healthcheck.verify_outbound_tls_access()
+
+            assert fail_count == 0
+            assert http_stub.requests == ['/ping']
+
+        with HTTPStub(delay=2) as http_stub:
+            self.healthcheck.amp_receiver_url = http_stub.url + '/ping'
+            self.healthcheck.amp_receiver_timeout = 0.2
+            started = time.time()
+            fail_count = self.healthcheck.verify_outbound_tls_access()
+
+            assert fail_count > 0
+            assert time.time() - started < 2.5
 
     # @xfail
     # @pytest.mark.focus
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.get')
     def test_verify_outbound_tls_access(self, get_mock):
+        get_mock.return_value.timings = None
         fail_count = self.healthcheck.verify_outbound_tls_access()
         assert fail_count == 0
 
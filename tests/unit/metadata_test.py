@@ -0,0 +1,67 @@
+import os
+import pytest
+import shutil
+import tempfile
+
+from amplifyhealthcheck.metadata import find_distributions, distribution_index, require, Distribution, \
+    DistributionNotFound, VersionConflict
+from unittest import TestCase
+
+xfail = pytest.mark.xfail
+
+
+class MetadataTestCase(TestCase):
+    def setup_method(self, method):
+        self.path = tempfile.mkdtemp()
+
+        os.makedirs(os.path.join(self.path, 'python_daemon-2.0.6.dist-info'))
+        os.makedirs(os.path.join(self.path, 'gevent-1.1.0-py2.7.egg-info'))
+        os.makedirs(os.path.join(self.path, 'gevent'))
+
+        with open(os.path.join(self.path, 'python_daemon-2.0.6.dist-info', 'METADATA'), 'w') as f:
+            f.write('Metadata-Version: 2.1\nName: python-daemon\nVersion: 2.0.6\n\nName: not a header\n')
+
+        with open(os.path.join(self.path, 'PyMySQL-0.7.11-py2.7.egg-info'), 'w') as f:
+            f.write('Metadata-Version: 1.1\nName: PyMySQL\nVersion: 0.7.11\n')
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.path)
+
+    # @xfail
+    def test_find_distributions(self):
+        dists = sorted((dist.project_name, dist.version) for dist in find_distributions(self.path))
+
+        # gevent has no PKG-INFO, so its name and version come from the directory name
+        assert dists == [('PyMySQL', '0.7.11'), ('gevent', '1.1.0'), ('python-daemon', '2.0.6')]
+        assert list(find_distributions('/path_does_not_exist')) == []
+
+    # @xfail
+    def test_distribution_index(self):
+        other_path = tempfile.mkdtemp()
+
+        try:
+            os.makedirs(os.path.join(other_path, 'gevent-1.2.0.dist-info'))
+            index = distribution_index([self.path, other_path])
+        finally:
+            shutil.rmtree(other_path)
+
+        assert sorted(index.keys()) == ['gevent', 'pymysql', 'python-daemon']
+        assert index['gevent'].version == '1.1.0'
+
+    # @xfail
+    def test_require(self):
+        index = distribution_index([self.path])
+        other_index = {'gevent': Distribution('gevent', '1.2.0', '/usr/lib/python2.7/site-packages')}
+
+        assert require('python_daemon==2.0.6', index).project_name == 'python-daemon'
+        assert require('pymysql>=0.7,<0.8', index).version == '0.7.11'
+        assert require('gevent==1.2.0', index, other_index).version == '1.2.0'
+
+        with pytest.raises(VersionConflict):
+            require('gevent==1.2.0', index)
+
+        with pytest.raises(DistributionNotFound):
+            require('ujson==1.33', index, other_index)
+
+        with pytest.raises(ValueError):
+            require('gevent=1.1.0', index)
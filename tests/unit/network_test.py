@@ -0,0 +1,71 @@
+import pytest
+
+from amplifyhealthcheck.network import http_session
+from requests.exceptions import SSLError
+from stubs import HTTPStub
+from unittest import TestCase
+
+xfail = pytest.mark.xfail
+
+cert_file = 'tests/fixtures/certs/receiver.crt'
+key_file = 'tests/fixtures/certs/receiver.key'
+
+
+class NetworkTestCase(TestCase):
+    # @xfail
+    def test_http_session_timings(self):
+        with HTTPStub(body='pong', cert_file=cert_file, key_file=key_file) as stub:
+            # the certificate is for receiver.amplify.test, which is pinned to the stub
+            session = http_session({'receiver.amplify.test': '127.0.0.1'}, pool_size=2)
+            # REQUESTS_CA_BUNDLE would take precedence over session.verify
+            session.trust_env = False
+            session.verify = cert_file
+            url = stub.url.replace('127.0.0.1', 'receiver.amplify.test') + '/ping'
+
+            first = session.get(url, timeout=5)
+            second = session.get(url, timeout=5)
+
+            assert first.text == second.text == 'pong'
+            assert not first.timings.reused
+            assert first.timings.connect > 0
+            assert first.timings.tls > 0
+            assert first.timings.first_byte > 0
+
+            # the second request goes over the connection the first one opened
+            assert second.timings.reused
+            assert second.timings.connect == second.timings.tls == 0
+            assert second.timings.first_byte > 0
+            assert stub.connections == 1
+            assert stub.requests == ['/ping', '/ping']
+
+            session.close()
+
+    # @xfail
+    def test_http_session_verify(self):
+        with HTTPStub(cert_file=cert_file, key_file=key_file) as stub:
+            session = http_session({'receiver.amplify.test': '127.0.0.1'})
+            session.trust_env = False
+
+            # self-signed, so only trusted when asked to
+            with pytest.raises(SSLError):
+                session.get(stub.url.replace('127.0.0.1', 'receiver.amplify.test'), timeout=5)
+
+            session.verify = cert_file
+
+            # pinned or not, the certificate is checked against the name in the url
+            with pytest.raises(SSLError):
+                session.get(stub.url, timeout=5)
+
+            session.close()
+
+    # @xfail
+    def test_http_session_plain(self):
+        with HTTPStub(body='pong') as stub:
+            session = http_session()
+            res = session.get(stub.url + '/ping', timeout=5)
+
+            assert res.text == 'pong'
+            assert res.timings.tls == 0
+            assert not res.timings.reused
+
+            session.close()
@@ -0,0 +1,88 @@
+import os
+import pytest
+import shutil
+import stat
+import tempfile
+
+from amplifyhealthcheck.ngxbuild import BuildInspector, install_prefix, parse_version_output
+from unittest import TestCase
+
+xfail = pytest.mark.xfail
+
+nginx_version_output = (
+    'nginx version: nginx/1.21.6 (nginx-plus-r27)\n'
+    'built by gcc 10.2.1 20210110 (Debian 10.2.1-6)\n'
+    'built with OpenSSL 1.1.1n  15 Mar 2022\n'
+    'TLS SNI support enabled\n'
+    'configure arguments: --prefix=/etc/nginx --with-http_ssl_module --with-http_stub_status_module'
+    ' --with-stream_ssl_module=dynamic --without-http_rewrite_module --add-dynamic-module=/build/ngx_devel_kit/'
+    " --with-cc-opt='-g -O2 -ffile-prefix-map=/data/builder/debuild/nginx-1.21.6=.'"
+    " --with-ld-opt='-Wl,-z,relro -Wl,--as-needed -pie'\n"
+)
+
+
+class NgxBuildTestCase(TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.binary = os.path.join(self.temp_dir, 'nginx')
+        self.write_binary(nginx_version_output)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def write_binary(self, output):
+        with open(self.binary, 'w') as f:
+            f.write("#!/bin/sh\ncat >&2 <<'EOF'\n{0}EOF\n".format(output))
+
+        os.chmod(self.binary, os.stat(self.binary).st_mode | stat.S_IXUSR)
+
+    # @xfail
+    def test_parse_version_output(self):
+        build = parse_version_output(nginx_version_output)
+
+        assert build.version == '1.21.6'
+        assert build.modules == frozenset([
+            'http_ssl_module', 'http_stub_status_module', 'stream_ssl_module', 'ngx_devel_kit'
+        ])
+        assert "--with-cc-opt=-g -O2 -ffile-prefix-map=/data/builder/debuild/nginx-1.21.6=." in build.configure_args
+        assert install_prefix(build.configure_args) == '/etc/nginx'
+        assert install_prefix(('--with-http_ssl_module',)) == '/usr/local/nginx'
+
+        assert parse_version_output('nginx: [alert] could not open error log file').version is None
+
+    # @xfail
+    def test_inspect(self):
+        cache_dir = os.path.join(self.temp_dir, 'cache')
+        inspector = BuildInspector(cache_dir)
+        build = inspector.inspect(self.binary)
+
+        assert build.version == '1.21.6'
+        assert 'http_stub_status_module' in build.modules
+        assert (inspector.hits, inspector.misses) == (0, 1)
+
+        # a later run reads it back rather than running the binary
+        inspector = BuildInspector(cache_dir)
+
+        assert inspector.inspect(self.binary) == build
+        assert (inspector.hits, inspector.misses) == (1, 0)
+
+        # an upgrade replaces the binary
+        self.write_binary(nginx_version_output.replace('1.21.6', '1.25.3'))
+        os.utime(self.binary, (0, 0))
+
+        assert inspector.inspect(self.binary).version == '1.25.3'
+        assert (inspector.hits, inspector.misses) == (1, 1)
+
+        assert inspector.inspect(self.binary, use_cache=False).version == '1.25.3'
+        assert inspector.misses == 2
+
+    # @xfail
+    def test_inspect_failed(self):
+        inspector = BuildInspector(os.path.join(self.temp_dir, 'cache'))
+
+        assert inspector.inspect(os.path.join(self.temp_dir, 'missing')) is None
+
+        self.write_binary('nginx: [emerg] something went wrong\n')
+
+        assert inspector.inspect(self.binary) is None
+        assert not os.path.exists(os.path.join(self.temp_dir, 'cache'))
@@ -0,0 +1,50 @@
+import pytest
+
+from amplifyhealthcheck.ngxproc import conf_file_from_cmdline, discover_instances
+from amplifyhealthcheck.procfs import Process, ProcessSnapshot
+from unittest import TestCase
+
+xfail = pytest.mark.xfail
+
+default_conf_file = '/etc/nginx/nginx.conf'
+
+
+class NgxProcTestCase(TestCase):
+    # @xfail
+    def test_conf_file_from_cmdline(self):
+        assert conf_file_from_cmdline(['nginx: master process /usr/sbin/nginx'], default_conf_file) == default_conf_file
+        assert conf_file_from_cmdline(
+            ['nginx: master process /usr/sbin/nginx -c /srv/a/nginx.conf -g daemon off;'], default_conf_file
+        ) == '/srv/a/nginx.conf'
+        assert conf_file_from_cmdline(
+            ['nginx: master process nginx -p /srv/b/ -c conf/nginx.conf'], default_conf_file
+        ) == '/srv/b/conf/nginx.conf'
+        assert conf_file_from_cmdline(['nginx: master process nginx -c/srv/c.conf'], default_conf_file) == '/srv/c.conf'
+        assert conf_file_from_cmdline(['nginx: master process nginx -c'], default_conf_file) == default_conf_file
+
+    # @xfail
+    def test_discover_instances(self):
+        snapshot = ProcessSnapshot({
+            1: Process(1, 0, 0, '/sbin/init', ['/sbin/init'], 'init'),
+            10: Process(10, 1, 0, None, ['nginx: master process /usr/sbin/nginx'], 'nginx'),
+            11: Process(11, 10, 33, None, ['nginx: worker process'], 'nginx'),
+            12: Process(12, 10, 33, None, ['nginx: cache manager process'], 'nginx'),
+            # a second instance in a container sharing the pid namespace
+            20: Process(20, 19, 0, None, ['nginx: master process nginx -c /srv/b/nginx.conf'], 'nginx'),
+            21: Process(21, 20, 101, None, ['nginx: worker process'], 'nginx'),
+            22: Process(22, 20, 101, None, ['nginx: worker process'], 'nginx'),
+            # mid binary upgrade, the new master is a child of the old one
+            30: Process(30, 10, 0, None, ['nginx: master process /usr/sbin/nginx'], 'nginx'),
+            31: Process(31, 30, 33, None, ['nginx: worker process'], 'nginx'),
+            40: Process(40, 1, 0, None, ['/usr/bin/python', 'nginx-master-process.py'], 'python')
+        })
+
+        instances = discover_instances(snapshot, default_conf_file)
+
+        assert instances.keys() == [10, 20, 30]
+        assert [worker.pid for worker in instances[10].workers] == [11]
+        assert [worker.pid for worker in instances[20].workers] == [21, 22]
+        assert [worker.pid for worker in instances[30].workers] == [31]
+        assert instances[10].conf_file == default_conf_file
+        assert instances[20].conf_file == '/srv/b/nginx.conf'
+        assert discover_instances(ProcessSnapshot({}), default_conf_file) == {}
@@ -0,0 +1,61 @@
+import pytest
+import time
+
+from amplifyhealthcheck.ntp import median, query_servers
+from stubs import NTPStub
+from unittest import TestCase
+
+xfail = pytest.mark.xfail
+
+
+def address(stub):
+    return stub.address
+
+
+class NTPTestCase(TestCase):
+    # @xfail
+    def test_median(self):
+        assert median([3, 1, 2]) == 2
+        assert median([4, 1, 3, 2]) == 2.5
+        assert median([-0.5]) == -0.5
+
+    # @xfail
+    def test_query_servers(self):
+        with NTPStub(offset=30) as first, NTPStub(offset=-30, delay=0.5) as second:
+            samples = query_servers([address(first), address(second)], quorum=2, timeout=5)
+
+            assert [sample.server for sample in samples] == [address(first), address(second)]
+            assert [sample.error for sample in samples] == [None, None]
+            assert abs(samples[0].offset - 30) < 0.1
+            assert abs(samples[1].offset + 30) < 0.1
+            # the server's own half second of processing time is not part of the round trip
+            assert 0 <= samples[1].delay < 0.25
+
+    # @xfail
+    def test_query_servers_quorum(self):
+        with NTPStub(respond=False) as dead, NTPStub() as alive, NTPStub(respond=False) as silent:
+            started = time.time()
+            samples = query_servers([address(dead), address(alive), address(silent)], quorum=1, timeout=5)
+
+            # the first answer makes the quorum, the rest are not waited for until the timeout
+            assert time.time() - started < 2.5
+            assert [sample.error for sample in samples] == ['not waited for', None, 'not waited for']
+
+    # @xfail
+    def test_query_servers_deadline(self):
+        with NTPStub(respond=False) as dead, NTPStub() as alive:
+            started = time.time()
+            samples = query_servers([address(dead), address(alive)], quorum=2, timeout=0.5)
+
+            # short of the quorum, the answers are waited for until the timeout and no longer
+            assert 0.5 <= time.time() - started < 2.5
+            assert [sample.error for sample in samples] == ['timed out', None]
+
+        # nothing listening on the port
+        with NTPStub() as stub:
+            closed = address(stub)
+
+        samples = query_servers([closed], quorum=1, timeout=0.2)
+
+        assert samples[0].offset is None
+        assert samples[0].error
@@ -0,0 +1,107 @@
+import os
+import pytest
+import shutil
+import tempfile
+
+from amplifyhealthcheck.procfs import NoSuchProcess, ProcessSnapshot
+from unittest import TestCase
+
+xfail = pytest.mark.xfail
+
+
+class ProcfsTestCase(TestCase):
+    def setup_method(self, method):
+        self.proc_path = tempfile.mkdtemp()
+
+        self.add_process(1, '1 (init) S 0 1 1 0', ['/sbin/init', 'splash'], '/sbin/init')
+        self.add_process(120, '120 (nginx) S 1 120 120 0', ['nginx: master process /usr/sbin/nginx'], '/usr/sbin/nginx')
+        self.add_process(121, '121 (nginx) S 120 120 120 0', ['nginx: worker process'])
+        self.add_process(122, '122 (nginx) S 120 120 120 0', ['nginx: worker process'])
+        self.add_process(130, '130 (amplify-agent) S 1 130 130 0', ['amplify-agent', '--config'])
+        self.add_process(140, '140 (python (x) y) R 130 130 130 0', ['/usr/bin/python2.7', 'x.py'])
+        self.add_process(150, '150 (php-fpm7.2-worke) S 1 150 150 0', ['php-fpm7.2-worker'])
+
+        os.makedirs(os.path.join(self.proc_path, 'sys'))
+        os.makedirs(os.path.join(self.proc_path, '999'))
+
+    def teardown_method(self, method):
+        shutil.rmtree(self.proc_path)
+
+    def add_process(self, pid, stat, cmdline, exe=None):
+        pid_path = os.path.join(self.proc_path, str(pid))
+        os.makedirs(pid_path)
+
+        with open(os.path.join(pid_path, 'stat'), 'w') as f:
+            f.write(stat + ' 0 0 0\n')
+
+        with open(os.path.join(pid_path, 'cmdline'), 'w') as f:
+            f.write('\0'.join(cmdline) + '\0')
+
+        if exe is not None:
+            os.symlink(exe, os.path.join(pid_path, 'exe'))
+
+    # @xfail
+    def test_take(self):
+        snapshot = ProcessSnapshot(proc_path=self.proc_path).take()
+
+        # 999 has no stat, it exited while /proc was listed
+        assert snapshot.entries == 8
+        assert snapshot.pids() == [1, 120, 121, 122, 130, 140, 150]
+
+        master = snapshot.process('120')
+
+        assert (master.ppid, master.uid, master.exe) == (1, os.getuid(), '/usr/sbin/nginx')
+        assert master.cmdline == ['nginx: master process /usr/sbin/nginx']
+        assert snapshot.process(121).exe is None
+        assert snapshot.process(140).name == 'python (x) y'
+        assert snapshot.process(140).ppid == 130
+        assert snapshot.process(150).name == 'php-fpm7.2-worker'
+
+        with pytest.raises(NoSuchProcess):
+            snapshot.process(999)
+
+    # @xfail
+    def test_single_process(self):
+        snapshot = ProcessSnapshot(proc_path=self.proc_path)
+
+        # looked up by pid, a process is read on its own and the table is not taken
+        assert snapshot.process(130).name == 'amplify-agent'
+        assert snapshot.visible(120)
+        assert not snapshot.visible(999)
+        assert snapshot.processes is None
+
+        with pytest.raises(NoSuchProcess):
+            snapshot.process(999)
+
+        assert snapshot.find('nginx') == [120, 121, 122]
+        assert snapshot.processes is not None
+
+    # @xfail
+    def test_find(self):
+        snapshot = ProcessSnapshot(proc_path=self.proc_path)
+
+        assert snapshot.find('nginx: worker process') == [121, 122]
+        assert snapshot.find('nginx') == [120, 121, 122]
+        assert snapshot.find('init') == [1]
+        assert snapshot.find('python2.7') == [140]
+        assert snapshot.find('apache2') == []
+
+    # @xfail
+    def test_mount_options(self):
+        snapshot = ProcessSnapshot(proc_path=self.proc_path)
+
+        assert snapshot.mount_options() == []
+
+        with open(os.path.join(self.proc_path, 'mounts'), 'w') as f:
+            f.write('sysfs /sys sysfs rw,nosuid 0 0\n')
+            f.write('proc %s proc rw,nosuid,nodev,noexec,relatime,hidepid=2 0 0\n' % self.proc_path)
+
+        assert 'hidepid=2' in snapshot.mount_options()
+        assert snapshot.visible(120) is True
+        assert snapshot.visible('999') is False
+
+    # @xfail
+    def test_take_unreadable(self):
+        snapshot = ProcessSnapshot(proc_path=os.path.join(self.proc_path, 'missing')).take()
+
+        assert (snapshot.entries, snapshot.pids()) == (0, [])
@@ -0,0 +1,48 @@
+import pytest
+import tempfile
+
+from amplifyhealthcheck.resolver import Resolver, build_query, parse_response, read_nameservers
+from stubs import DNSStub
+from unittest import TestCase
+
+xfail = pytest.mark.xfail
+
+
+class ResolverTestCase(TestCase):
+    # @xfail
+    def test_read_nameservers(self):
+        resolv_conf = tempfile.NamedTemporaryFile()
+        resolv_conf.write('# generated\nsearch example.com\nnameserver 10.0.0.2\nnameserver  fd00::53\noptions ndots:2\n')
+        resolv_conf.flush()
+
+        assert read_nameservers(resolv_conf.name) == [('10.0.0.2', 53), ('fd00::53', 53)]
+        assert read_nameservers('/nonexistent/resolv.conf') == []
+
+    # @xfail
+    def test_parse_response(self):
+        stub = DNSStub({'receiver.amplify.nginx.com': ['10.0.0.1', '10.0.0.2']})
+        query = build_query(4242, 'receiver.amplify.nginx.com.')
+
+        assert parse_response(stub.response(query)) == (4242, 0, ['10.0.0.1', '10.0.0.2'])
+        assert parse_response(stub.response(build_query(7, 'missing.test'))) == (7, 3, [])
+
+        stub.socket.close()
+
+    # @xfail
+    def test_resolve(self):
+        with DNSStub({'a.test': ['10.0.0.1']}) as good, DNSStub({}, respond=False) as silent:
+            resolver = Resolver([silent.address, good.address], timeout=0.2)
+            answers = resolver.resolve(['a.test', 'b.test'])
+
+            assert [(answer.nameserver, answer.addresses, answer.error) for answer in answers['a.test']] == [
+                (silent.address, [], 'timed out'), (good.address, ['10.0.0.1'], None)
+            ]
+            assert answers['b.test'][1].error == 'NXDOMAIN'
+            assert answers['a.test'][1].latency < 0.2
+
+            assert resolver.address('a.test') == '10.0.0.1'
+            assert resolver.address('b.test') is None
+            assert resolver.address('127.0.0.2') == '127.0.0.2'
+            assert len(good.received) == 2
+
+        assert Resolver([]).resolve(['a.test']) == {'a.test': []}
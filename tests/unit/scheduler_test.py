@@ -0,0 +1,183 @@
+import mock
+import pytest
+import threading
+import time
+
+from amplifyhealthcheck.base import Base
+from amplifyhealthcheck.scheduler import CheckScheduler, io_bound, cpu_bound, IO_BOUND, CPU_BOUND
+from unittest import TestCase
+
+xfail = pytest.mark.xfail
+
+
+class FakeHealthCheck(Base):
+    def __init__(self):
+        super(FakeHealthCheck, self).__init__()
+
+        self.threads = {}
+
+    @io_bound
+    def verify_slow(self):
+        time.sleep(0.2)
+        self.threads['verify_slow'] = threading.current_thread()
+        self.pretty_print('slow check')
+
+        return 1
+
+    @io_bound
+    def verify_fast(self):
+        self.threads['verify_fast'] = threading.current_thread()
+        self.pretty_print('fast check')
+
+        return 2
+
+    @cpu_bound
+    def verify_cpu(self):
+        self.threads['verify_cpu'] = threading.current_thread()
+        self.pretty_print('cpu check')
+
+        return 3
+
+    def verify_broken(self):
+        self.pretty_print('broken check')
+
+        raise AttributeError('broken')
+
+
+class SchedulerTestCase(TestCase):
+    def setup_method(self, method):
+        self.amphc = FakeHealthCheck()
+        self.amphc.decorate_mode = True
+
+    # @xfail
+    def test_check_kind(self):
+        scheduler = CheckScheduler(self.amphc)
+
+        assert scheduler.check_kind('verify_slow') == IO_BOUND
+        assert scheduler.check_kind('verify_cpu') == CPU_BOUND
+        assert scheduler.check_kind('verify_broken') == IO_BOUND
+
+    # @xfail
+    def test_run_sequential(self):
+        results = CheckScheduler(self.amphc, 1).run(['verify_slow', 'verify_fast', 'verify_cpu'])
+
+        assert results == [1, 2, 3]
+        assert self.amphc.threads['verify_slow'] is threading.current_thread()
+        assert [log.split(' ', 1)[1] for log in self.amphc.logs] == [
+            'slow check\033[0m', 'fast check\033[0m', 'cpu check\033[0m'
+        ]
+
+    # @xfail
+    def test_run_concurrent(self):
+        methods = ['verify_slow', 'verify_fast', 'verify_cpu']
+        results = CheckScheduler(self.amphc, 4).run(methods)
+
+        assert results == [1, 2, 3]
+        assert self.amphc.threads['verify_cpu'] is threading.current_thread()
+        assert self.amphc.threads['verify_slow'] is not threading.current_thread()
+        assert [log.split(' ', 1)[1] for log in self.amphc.logs] == [
+            'slow check\033[0m', 'fast check\033[0m', 'cpu check\033[0m'
+        ]
+
+    # @xfail
+    def test_run_concurrent_wall_clock(self):
+        lock = threading.Lock()
+        started = []
+        all_started = threading.Event()
+        overlapped = []
+
+        # each check only gets past the wait while the other two are running as well
+        def slow():
+            with lock:
+                started.append(1)
+
+                if len(started) == 3:
+                    all_started.set()
+
+            overlapped.append(all_started.wait(5))
+
+        for method in ['verify_slow_1', 'verify_slow_2', 'verify_slow_3']:
+            setattr(self.amphc, method, io_bound(mock.Mock(side_effect=slow)))
+
+        CheckScheduler(self.amphc, 3).run(['verify_slow_1', 'verify_slow_2', 'verify_slow_3'])
+
+        assert overlapped == [True, True, True]
+
+    # @xfail
+    def test_run_errors(self):
+        with pytest.raises(AttributeError):
+            CheckScheduler(self.amphc, 2).run(['verify_fast', 'verify_method3'])
+
+        assert self.amphc.logs == []
+
+        with pytest.raises(AttributeError):
+            CheckScheduler(self.amphc, 2).run(['verify_fast', 'verify_broken'])
+
+        assert len(self.amphc.logs) == 2
+
+    # @xfail
+    def test_run_time_budget(self):
+        def hung():
+            self.amphc.pretty_print('hung check started')
+            self.amphc.cancelled.wait(5)
+
+        self.amphc.verify_hung = io_bound(hung)
+        methods = ['verify_fast', 'verify_hung', 'verify_slow', 'verify_cpu']
+
+        started = time.time()
+        results = CheckScheduler(self.amphc, 1, time_budget=0.5).run(methods)
+
+        # well short of the 5s the hung check would take if it was never cancelled
+        assert time.time() - started < 4
+        assert results == [2, None, None, None]
+        assert self.amphc.cancelled.is_set()
+
+        # the output of the cancelled check is dropped, the checks queued behind it are not
+        # started, and the budget overruns are reported as warnings
+        assert [log.split(' ', 1)[1] for log in self.amphc.logs] == [
+            'fast check\033[0m',
+            'verify_hung did not finish within the 0.5s time budget and was cancelled\033[0m',
+            'verify_slow did not finish within the 0.5s time budget and was cancelled\033[0m',
+            'verify_cpu did not finish within the 0.5s time budget and was cancelled\033[0m'
+        ]
+        assert self.amphc.logs[1].startswith('\33[33m')
+        assert 'verify_slow' not in self.amphc.threads
+
+        # with a second thread the rest goes on while one check hangs
+        amphc = FakeHealthCheck()
+        amphc.verify_hung = io_bound(lambda: amphc.cancelled.wait(5))
+
+        assert CheckScheduler(amphc, 2, time_budget=0.5).run(methods) == [2, None, 1, 3]
+
+        amphc = FakeHealthCheck()
+
+        assert CheckScheduler(amphc, 1, time_budget=5).run(['verify_fast', 'verify_cpu']) == [2, 3]
+        assert not amphc.cancelled.is_set()
+
+    # @xfail
+    def test_map(self):
+        started = []
+        overlapped = []
+        all_started = threading.Event()
+
+        def check(delay):
+            started.append(delay)
+
+            if len(started) == 3:
+                all_started.set()
+
+            # only returns True when every check runs at once
+            overlapped.append(all_started.wait(5))
+            time.sleep(delay)
+            self.amphc.pretty_print('check %s' % delay)
+
+            return delay * 10
+
+        results = CheckScheduler(self.amphc, 3).map(check, [0.2, 0.1, 0.15])
+
+        assert overlapped == [True, True, True]
+        assert results == [2.0, 1.0, 1.5]
+        assert [log.split(' ', 1)[1] for log in self.amphc.logs] == [
+            'check 0.2\033[0m', 'check 0.1\033[0m', 'check 0.15\033[0m'
+        ]
+        assert CheckScheduler(self.amphc, 1).map(lambda item: item + 1, [1, 2]) == [2, 3]
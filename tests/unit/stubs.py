@@ -0,0 +1,182 @@
+import BaseHTTPServer
+import SocketServer
+import socket
+import ssl
+import struct
+import threading
+import time
+
+from ntplib import NTPPacket, system_to_ntp_time
+
+
+class StubServer(object):
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.daemon = True
+        self.thread.start()
+
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class ThreadingHTTPServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients giving up on a slow response are what the tests are about
+        pass
+
+
+class HTTPStub(StubServer):
+    def __init__(self, delay=0, status=200, body='OK', cert_file=None, key_file=None):
+        stub = self
+        self.delay = delay
+        self.status = status
+        self.body = body
+        self.requests = []
+        self.connections = 0
+        self.scheme = 'https' if cert_file else 'http'
+
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            # keep-alive, so that clients can reuse their connections
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                stub.connections += 1
+                BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+
+            def do_GET(self):
+                stub.requests.append(self.path)
+                time.sleep(stub.delay)
+
+                body = stub.body() if callable(stub.body) else stub.body
+
+                self.send_response(stub.status)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+
+        if cert_file:
+            context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+            context.load_cert_chain(cert_file, key_file)
+            self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+
+    @property
+    def url(self):
+        return '{0}://127.0.0.1:{1}'.format(self.scheme, self.server.server_address[1])
+
+    def serve(self):
+        self.server.serve_forever(poll_interval=0.05)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class UDPStub(StubServer):
+    def __init__(self, delay=0, respond=True, release=None):
+        self.delay = delay
+        self.respond = respond
+        # when given, responses are held back until release() is true
+        self.release = release
+        self.running = True
+        self.received = []
+        self.received_at = None
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(('127.0.0.1', 0))
+        self.socket.settimeout(0.05)
+
+    @property
+    def address(self):
+        return self.socket.getsockname()
+
+    def serve(self):
+        held = []
+
+        while self.running:
+            if held and self.release():
+                for data, address in held:
+                    self.reply(data, address)
+
+                held = []
+
+            try:
+                data, address = self.socket.recvfrom(512)
+            except socket.timeout:
+                continue
+            except socket.error:
+                return
+
+            self.received.append(data)
+            self.received_at = time.time()
+
+            if self.respond and self.release is not None:
+                held.append((data, address))
+            elif self.respond:
+                self.reply(data, address)
+
+    def reply(self, data, address):
+        # the delay is the server's processing time, the response is made after it
+        time.sleep(self.delay)
+        self.socket.sendto(self.response(data), address)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        self.socket.close()
+
+
+class DNSStub(UDPStub):
+    def __init__(self, records, delay=0, respond=True, release=None):
+        super(DNSStub, self).__init__(delay, respond, release)
+
+        self.records = records
+
+    def response(self, query):
+        query_id = struct.unpack('!H', query[:2])[0]
+        labels = []
+        offset = 12
+
+        while ord(query[offset]):
+            length = ord(query[offset])
+            labels.append(query[offset + 1:offset + 1 + length])
+            offset += length + 1
+
+        question = query[12:offset + 5]
+        addresses = self.records.get('.'.join(labels), [])
+        # NXDOMAIN for names without records
+        flags = 0x8180 if addresses else 0x8183
+        answers = ''.join(
+            struct.pack('!HHHIH', 0xc00c, 1, 1, 60, 4) + socket.inet_aton(address) for address in addresses
+        )
+
+        return struct.pack('!HHHHHH', query_id, flags, 1, len(addresses), 0, 0) + question + answers
+
+
+class NTPStub(UDPStub):
+    def __init__(self, delay=0, offset=0, respond=True):
+        super(NTPStub, self).__init__(delay, respond)
+
+        self.offset = offset
+
+    @property
+    def server(self):
+        return '127.0.0.1:{0}'.format(self.address[1])
+
+    def response(self, data):
+        query = NTPPacket()
+        query.from_data(data)
+
+        response = NTPPacket(version=query.version, mode=4, tx_timestamp=system_to_ntp_time(time.time() + self.offset))
+        response.stratum = 2
+        response.orig_timestamp = query.tx_timestamp
+        response.recv_timestamp = system_to_ntp_time(self.received_at + self.offset)
+
+        return response.to_data()